@@ -0,0 +1,61 @@
+# Converter benchmark: cues/sec and peak memory for the VTT -> SRT/TXT
+# converters and every streaming renderer, on synthetic fixtures.
+#
+#   python benchmarks/bench_convert.py [--repeat 5] [--fixture auto_1h ...]
+import argparse
+import io
+import logging
+import statistics
+import time
+import tracemalloc
+
+from fixtures import FIXTURES, load_server
+
+def measure(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+
+    # Peak memory is taken from a separate run so tracing doesn't skew timings
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return statistics.median(timings), min(timings), peak
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark subtitle conversion')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--fixture', action='append', choices=sorted(FIXTURES))
+    args = parser.parse_args()
+
+    server, _ = load_server()
+    logging.getLogger().setLevel(logging.WARNING)
+    extractor = server.subtitle_extractor
+
+    print(f"{'fixture':<14} {'converter':<16} {'cues':>7} {'median ms':>10} {'best ms':>9} "
+          f"{'cues/sec':>11} {'peak KiB':>9}")
+
+    for name in args.fixture or list(FIXTURES):
+        vtt = FIXTURES[name]()
+        cue_count = sum(1 for _ in server.iter_vtt_cues(io.StringIO(vtt)))
+        cues = list(server.iter_vtt_cues(io.StringIO(vtt)))
+
+        cases = {
+            'convert_vtt_srt': lambda: extractor.convert_vtt_to_srt(vtt),
+            'convert_vtt_txt': lambda: extractor.convert_vtt_to_txt(vtt),
+            'parse_cues': lambda: list(server.iter_vtt_cues(io.StringIO(vtt))),
+        }
+        for format, renderer in server.SUBTITLE_RENDERERS.items():
+            cases[f"render_{format}"] = lambda renderer=renderer: ''.join(renderer(cues))
+
+        for case, fn in cases.items():
+            median, best, peak = measure(fn, args.repeat)
+            print(f"{name:<14} {case:<16} {cue_count:>7} {median * 1000:>10.1f} {best * 1000:>9.1f} "
+                  f"{cue_count / median:>11,.0f} {peak / 1024:>9,.0f}")
+
+if __name__ == '__main__':
+    main()
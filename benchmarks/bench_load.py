@@ -0,0 +1,118 @@
+# End-to-end load harness: boots the app on a local threaded server with the
+# fake extractor backend and drives the main routes from concurrent clients,
+# reporting req/s and latency percentiles per route.
+#
+#   python benchmarks/bench_load.py [--duration 10] [--concurrency 8] [--videos 50]
+import argparse
+import logging
+import random
+import threading
+import time
+
+import requests
+from werkzeug.serving import make_server
+
+from fixtures import FIXTURES, load_server
+
+# Relative weights of each step in a simulated user session
+ROUTE_MIX = [
+    ('index', 1),
+    ('get_video_info', 2),
+    ('download_subtitle', 2),
+    ('download_file', 3),
+]
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+class LoadClient(threading.Thread):
+    def __init__(self, base_url, args, deadline, seed):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.args = args
+        self.deadline = deadline
+        self.random = random.Random(seed)
+        self.session = requests.Session()
+        self.download_urls = []
+        self.samples = []
+
+    def request(self, route):
+        video_id = f"bench{self.random.randrange(self.args.videos):06d}"
+        url = f"https://www.youtube.com/watch?v={video_id}"
+        language = self.random.choice(['vi', 'en'])
+        format = self.random.choice(['srt', 'txt', 'vtt'])
+
+        if route == 'index':
+            return self.session.get(f"{self.base_url}/")
+        if route == 'get_video_info':
+            return self.session.post(f"{self.base_url}/get_video_info", json={'url': url})
+        if route == 'download_subtitle':
+            response = self.session.post(f"{self.base_url}/download_subtitle",
+                                         json={'url': url, 'language': language, 'format': format})
+            data = response.json()
+            if data.get('success'):
+                self.download_urls.append(data['download_url'])
+            return response
+        return self.session.get(f"{self.base_url}{self.random.choice(self.download_urls)}",
+                                headers={'Accept-Encoding': 'gzip'})
+
+    def run(self):
+        routes = [route for route, _ in ROUTE_MIX]
+        weights = [weight for _, weight in ROUTE_MIX]
+
+        while time.perf_counter() < self.deadline:
+            route = self.random.choices(routes, weights)[0]
+            if route == 'download_file' and not self.download_urls:
+                route = 'download_subtitle'
+            started = time.perf_counter()
+            try:
+                response = self.request(route)
+                ok = response.status_code < 400
+            except (requests.RequestException, ValueError):
+                ok = False
+            self.samples.append((route, time.perf_counter() - started, ok))
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the Flask routes offline')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds to run')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent clients')
+    parser.add_argument('--videos', type=int, default=50, help='distinct video ids (controls cache hit rate)')
+    parser.add_argument('--extraction-latency', type=float, default=0.2, help='seconds per fake extraction')
+    parser.add_argument('--track', choices=sorted(FIXTURES), default='manual_short', help='caption fixture served')
+    args = parser.parse_args()
+
+    server, workdir = load_server(args.extraction_latency, FIXTURES[args.track]())
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    http_server = make_server('127.0.0.1', 0, server.app, threaded=True)
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{http_server.server_port}"
+
+    print(f"workdir {workdir}, {args.concurrency} clients for {args.duration:.0f}s against {base_url}")
+    started = time.perf_counter()
+    clients = [LoadClient(base_url, args, started + args.duration, seed) for seed in range(args.concurrency)]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - started
+    http_server.shutdown()
+
+    samples = [sample for client in clients for sample in client.samples]
+    print(f"\n{'route':<18} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} "
+          f"{'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+
+    for route in [route for route, _ in ROUTE_MIX] + ['total']:
+        route_samples = [s for s in samples if route in ('total', s[0])]
+        latencies = sorted(latency for _, latency, _ in route_samples)
+        errors = sum(1 for _, _, ok in route_samples if not ok)
+        print(f"{route:<18} {len(route_samples):>9} {errors:>7} {len(route_samples) / elapsed:>8.1f} "
+              f"{percentile(latencies, 0.5) * 1000:>8.1f} {percentile(latencies, 0.9) * 1000:>8.1f} "
+              f"{percentile(latencies, 0.99) * 1000:>8.1f} {(latencies[-1] if latencies else 0) * 1000:>8.1f}")
+
+if __name__ == '__main__':
+    main()
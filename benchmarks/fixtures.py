@@ -0,0 +1,119 @@
+# Synthetic subtitle fixtures and an offline server loader shared by the
+# benchmark scripts. Nothing here touches the network.
+import json
+import os
+import random
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORDS = [
+    'xin', 'chào', 'các', 'bạn', 'hôm', 'nay', 'chúng', 'ta', 'sẽ', 'học', 'về', 'python',
+    'the', 'quick', 'brown', 'fox', 'jumps', 'over', 'lazy', 'dog', 'and', 'then', 'we',
+    'talk', 'about', 'subtitles', 'caching', 'latency', 'video', 'download', 'server'
+]
+
+def format_timestamp(seconds):
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{secs:06.3f}"
+
+# Short, human-authored style track: a few hundred standalone cues
+def manual_vtt(cue_count=300, seed=1):
+    rnd = random.Random(seed)
+    lines = ['WEBVTT', 'Kind: captions', 'Language: vi', '']
+    start = 0.0
+
+    for i in range(cue_count):
+        end = start + rnd.uniform(1.5, 4.0)
+        lines.append(str(i + 1))
+        lines.append(f"{format_timestamp(start)} --> {format_timestamp(end)}")
+        lines.append(' '.join(rnd.choice(WORDS) for _ in range(rnd.randint(4, 9))))
+        if rnd.random() < 0.3:
+            lines.append(' '.join(rnd.choice(WORDS) for _ in range(rnd.randint(3, 6))))
+        lines.append('')
+        start = end + 0.2
+
+    return '\n'.join(lines) + '\n'
+
+# YouTube auto-caption style track: every line is shown twice, first with
+# per-word <c> timing tags next to the previous line, then as a 10ms
+# "settled" cue, which is what the de-duplicating converters are built for
+def auto_vtt(duration_seconds, seed=1):
+    rnd = random.Random(seed)
+    lines = ['WEBVTT', 'Kind: captions', 'Language: en', '']
+    previous = ''
+    start = 0.0
+
+    while start < duration_seconds:
+        words = [rnd.choice(WORDS) for _ in range(rnd.randint(5, 8))]
+        tagged = words[0] + ''.join(
+            f"<{format_timestamp(start + 0.25 * i)}><c> {word}</c>" for i, word in enumerate(words[1:], 1)
+        )
+
+        lines.append(f"{format_timestamp(start)} --> {format_timestamp(start + 2.0)} align:start position:0%")
+        lines.append(previous)
+        lines.append(tagged)
+        lines.append('')
+        lines.append(f"{format_timestamp(start + 2.0)} --> {format_timestamp(start + 2.01)} align:start position:0%")
+        lines.append(previous)
+        lines.append(' '.join(words))
+        lines.append('')
+
+        previous = ' '.join(words)
+        start += 2.01
+
+    return '\n'.join(lines) + '\n'
+
+FIXTURES = {
+    'manual_short': lambda: manual_vtt(300),
+    'auto_1h': lambda: auto_vtt(3600),
+    'auto_3h': lambda: auto_vtt(3 * 3600),
+}
+
+# Info dict in the shape `yt-dlp -J` writes; FakeExtractorBackend substitutes {id}
+def fake_video_info(video_id='{id}'):
+    return {
+        'id': video_id,
+        'title': f"Benchmark video {video_id}",
+        'duration': 3600,
+        'uploader': 'bench',
+        'view_count': 1000,
+        'thumbnail': f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg",
+        'subtitles': {
+            'vi': [{'ext': 'vtt', 'url': 'vi.vtt'}],
+        },
+        'automatic_captions': {
+            'en': [{'ext': 'vtt', 'url': 'en.vtt'}],
+        },
+    }
+
+def write_extractor_fixtures(fixture_dir, track_text):
+    os.makedirs(fixture_dir, exist_ok=True)
+    with open(os.path.join(fixture_dir, '_default.info.json'), 'w', encoding='utf-8') as f:
+        json.dump(fake_video_info(), f, ensure_ascii=False)
+    for language in ('vi', 'en'):
+        with open(os.path.join(fixture_dir, f"{language}.vtt"), 'w', encoding='utf-8') as f:
+            f.write(track_text)
+
+# Imports and boots server.py from a scratch directory so its database, log
+# and cache never touch the working tree, with the fake extractor backend
+# serving fixtures; extraction_latency mimics a real extract_info call.
+def load_server(extraction_latency=0.0, track_text=None, workdir=None):
+    workdir = workdir or tempfile.mkdtemp(prefix='dowsub-bench-')
+    fixture_dir = os.path.join(workdir, 'fixtures')
+    write_extractor_fixtures(fixture_dir, track_text or manual_vtt())
+
+    os.environ.update({
+        'EXTRACTOR_BACKEND': 'fake',
+        'EXTRACTOR_FIXTURE_DIR': fixture_dir,
+        'EXTRACTOR_FAKE_LATENCY': str(extraction_latency),
+    })
+    os.chdir(workdir)
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+
+    import server
+    server.create_app()
+    return server, workdir
@@ -1,40 +1,57 @@
-from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for, session
+import time
+BOOT_STARTED = time.perf_counter()  # boot-time breakdown starts before the heavy imports
+from flask import Flask, Response, render_template, request, jsonify, send_file, redirect, url_for, session
 import requests
 import re
-import time
 import os
 import subprocess
 import sys
 import tempfile
 from datetime import datetime, timedelta
 import threading
+import queue
 import json
 import sqlite3
 from functools import wraps
 import uuid
 import hashlib
-from urllib.parse import urlparse, parse_qs
+from urllib.parse import urlparse, parse_qs, quote
 import secrets
 from werkzeug.utils import secure_filename
 from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.wsgi import ClosingIterator
+from werkzeug.http import dump_options_header
 import logging
-from contextlib import contextmanager
+import atexit
+from collections import OrderedDict, deque
+from contextlib import contextmanager, suppress
 import mimetypes
-from PIL import Image
+import unicodedata
 import io
+import math
+import zipfile
+import multiprocessing.connection
+import importlib.util
+import socket
+import ytdlp_worker
+import gzip
+import shutil
 
 app = Flask(__name__)
 app.secret_key = secrets.token_hex(32)
 
 # ===== LOGGING SETUP =====
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('app.log'),
-        logging.StreamHandler()
-    ]
-)
+# Handlers are attached by create_app(), so importing this module writes nothing
+def configure_logging():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('app.log'),
+            logging.StreamHandler()
+        ]
+    )
+
 logger = logging.getLogger(__name__)
 
 # ===== CONFIGURATION =====
@@ -42,14 +59,345 @@ UPLOAD_FOLDER = os.path.join('static', 'uploads', 'banners')
 MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 SUBTITLE_CACHE_DIR = "subtitle_cache"
+DATABASE_PATH = 'subtitle_app.db'
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 16))
+DB_BUSY_TIMEOUT = int(os.environ.get('DB_BUSY_TIMEOUT', 5))  # seconds
+DB_STATEMENT_CACHE_SIZE = 256
+SUBTITLE_CACHE_LEGACY_INDEX = "index.json"
+SUBTITLE_CACHE_TTL = int(os.environ.get('SUBTITLE_CACHE_TTL', 24 * 3600))  # seconds
+SUBTITLE_CACHE_MAINTENANCE_INTERVAL = int(os.environ.get('SUBTITLE_CACHE_MAINTENANCE_INTERVAL', 10))  # seconds
+SUBTITLE_CACHE_MAX_BYTES = int(os.environ.get('SUBTITLE_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+SUBTITLE_CACHE_MAX_FILES = int(os.environ.get('SUBTITLE_CACHE_MAX_FILES', 10000))
+SUBTITLE_CACHE_COMPRESS_LEVEL = int(os.environ.get('SUBTITLE_CACHE_COMPRESS_LEVEL', 6))
+DOWNLOAD_CACHE_MAX_AGE = int(os.environ.get('DOWNLOAD_CACHE_MAX_AGE', 3600))  # seconds
+VIDEO_INFO_CACHE_SIZE = int(os.environ.get('VIDEO_INFO_CACHE_SIZE', 512))
+VIDEO_INFO_CACHE_TTL = int(os.environ.get('VIDEO_INFO_CACHE_TTL', 3600))  # seconds
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 20))
+HTTP_TIMEOUT = int(os.environ.get('HTTP_TIMEOUT', 30))  # seconds
+STREAM_CHUNK_SIZE = 16 * 1024
+BANNER_CACHE_TTL = int(os.environ.get('BANNER_CACHE_TTL', 30))  # seconds
+BANNER_CLICK_FLUSH_INTERVAL = int(os.environ.get('BANNER_CLICK_FLUSH_INTERVAL', 5))  # seconds
+BUNDLE_MAX_LANGUAGES = int(os.environ.get('BUNDLE_MAX_LANGUAGES', 20))
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 4))
+BATCH_QUEUE_SIZE = int(os.environ.get('BATCH_QUEUE_SIZE', 500))
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 200))
+
+# Extractor backend: 'ytdlp' (in-process), 'pool' (warm yt-dlp worker processes),
+# 'subprocess' (yt-dlp CLI processes) or 'fake' (recorded fixtures, no network)
+EXTRACTOR_BACKEND = os.environ.get('EXTRACTOR_BACKEND', 'ytdlp')
+EXTRACTOR_POOL_SIZE = int(os.environ.get('EXTRACTOR_POOL_SIZE', os.cpu_count() or 2))
+EXTRACTOR_POOL_TASK_TIMEOUT = int(os.environ.get('EXTRACTOR_POOL_TASK_TIMEOUT', 60))  # seconds
+EXTRACTOR_POOL_START_TIMEOUT = int(os.environ.get('EXTRACTOR_POOL_START_TIMEOUT', 30))  # seconds
+EXTRACTOR_POOL_MAX_TASKS = int(os.environ.get('EXTRACTOR_POOL_MAX_TASKS', 200))  # recycle a worker after this many
+EXTRACTOR_SUBPROCESS_POOL_SIZE = int(os.environ.get('EXTRACTOR_SUBPROCESS_POOL_SIZE', 4))
+EXTRACTOR_SUBPROCESS_TIMEOUT = int(os.environ.get('EXTRACTOR_SUBPROCESS_TIMEOUT', 60))  # seconds
+EXTRACTOR_FIXTURE_DIR = os.environ.get('EXTRACTOR_FIXTURE_DIR', os.path.join('fixtures', 'extractor'))
+EXTRACTOR_FAKE_LATENCY = float(os.environ.get('EXTRACTOR_FAKE_LATENCY', 0))  # seconds per extraction
+# Set up the backend in the background at startup instead of on the first extraction
+EXTRACTOR_WARMUP = os.environ.get('EXTRACTOR_WARMUP', 'true').lower() == 'true'
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 4))
+JOB_QUEUE_SIZE = int(os.environ.get('JOB_QUEUE_SIZE', 100))
+JOB_RESULT_TTL = int(os.environ.get('JOB_RESULT_TTL', 600))  # seconds
+
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # optional bearer token for /metrics
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)  # seconds
 
-# Create directories
-os.makedirs(SUBTITLE_CACHE_DIR, exist_ok=True)
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+VISITOR_FLUSH_INTERVAL_MS = int(os.environ.get('VISITOR_FLUSH_INTERVAL_MS', 1000))
+VISITOR_FLUSH_MAX_EVENTS = int(os.environ.get('VISITOR_FLUSH_MAX_EVENTS', 500))
+ACTIVE_VISITOR_WINDOW = 5 * 60  # seconds
+ACTIVE_VISITOR_BUCKET = 30  # seconds
+
+# Shared keep-alive session for caption track downloads
+http_session = requests.Session()
+http_adapter = requests.adapters.HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+http_session.mount('https://', http_adapter)
+http_session.mount('http://', http_adapter)
+
+# ===== BOOT TIMING =====
+# Wall time per startup phase, logged once the app is ready and exported as
+# the boot_phase_seconds gauge
+class BootTimer:
+    def __init__(self, started):
+        self.lock = threading.Lock()
+        self.last = started
+        self.phases = {}
+    
+    def record(self, phase, seconds):
+        with self.lock:
+            self.phases[phase] = seconds
+    
+    # Closes a phase that ran since the previous mark (module-level code)
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.record(phase, now - self.last)
+        self.last = now
+    
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+    
+    def get_stats(self):
+        with self.lock:
+            return dict(self.phases)
+    
+    def report(self):
+        return ', '.join(f"{phase} {seconds * 1000:.0f}ms" for phase, seconds in self.get_stats().items())
+
+boot_timer = BootTimer(BOOT_STARTED)
+boot_timer.mark('imports')
+
+# ===== METRICS =====
+# In-process counters and latency histograms, rendered in the Prometheus text
+# format; components that already keep their own stats plug in as collectors
+class Metrics:
+    def __init__(self, buckets, prefix='dowsub'):
+        self.buckets = buckets
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.descriptions = {}
+        self.counters = {}
+        self.histograms = {}
+        self.collectors = []
+
+    def describe(self, name, kind, help_text):
+        self.descriptions[name] = (kind, help_text)
+
+    def register_collector(self, collector):
+        self.collectors.append(collector)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                # Per-bucket counts plus an overflow slot; made cumulative when rendered
+                histogram = self.histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            
+            index = next((i for i, bound in enumerate(self.buckets) if seconds <= bound), len(self.buckets))
+            histogram[0][index] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def record_error(self, stage, error):
+        self.inc('errors_total', stage=stage, type=type(error).__name__)
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.record_error(stage, e)
+            raise
+        finally:
+            self.observe('stage_duration_seconds', time.perf_counter() - start, stage=stage)
+
+    def snapshot(self):
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: (list(counts), total, count) for key, (counts, total, count) in self.histograms.items()}
+        
+        for collector in self.collectors:
+            try:
+                for name, labels, value in collector():
+                    counters[(name, tuple(sorted(labels.items())))] = value
+            except Exception as e:
+                logger.error(f"Metrics collector error: {e}")
+        
+        return counters, histograms
+
+    @staticmethod
+    def format_labels(labels):
+        if not labels:
+            return ''
+        
+        def escape(value):
+            return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        
+        return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in labels) + '}'
+
+    def render(self):
+        counters, histograms = self.snapshot()
+        names = sorted({name for name, _ in counters} | {name for name, _ in histograms})
+        
+        lines = []
+        for name in names:
+            full_name = f"{self.prefix}_{name}"
+            kind, help_text = self.descriptions.get(name, ('untyped', name))
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            
+            for (sample_name, labels), value in sorted(counters.items()):
+                if sample_name == name:
+                    lines.append(f"{full_name}{self.format_labels(labels)} {value}")
+            
+            for (sample_name, labels), (counts, total, count) in sorted(histograms.items()):
+                if sample_name != name:
+                    continue
+                
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{full_name}_bucket{self.format_labels(labels + (('le', bound),))} {cumulative}")
+                lines.append(f"{full_name}_bucket{self.format_labels(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{full_name}_sum{self.format_labels(labels)} {round(total, 6)}")
+                lines.append(f"{full_name}_count{self.format_labels(labels)} {count}")
+        
+        return '\n'.join(lines) + '\n'
+
+    def quantile(self, counts, count, q):
+        # Upper bound of the bucket holding the q-th observation
+        rank = q * count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return bound
+        return self.buckets[-1]
+
+    def summary(self):
+        counters, histograms = self.snapshot()
+        
+        latency = {}
+        for (name, labels), (counts, total, count) in histograms.items():
+            label = ' '.join(str(label_value) for _, label_value in labels)
+            latency.setdefault(name, {})[label] = {
+                'count': count,
+                'avg_ms': round(total / count * 1000, 1),
+                'p50_ms': self.quantile(counts, count, 0.5) * 1000,
+                'p95_ms': self.quantile(counts, count, 0.95) * 1000,
+                'p99_ms': self.quantile(counts, count, 0.99) * 1000
+            }
+        
+        values = {}
+        for (name, labels), value in counters.items():
+            label = ' '.join(str(label_value) for _, label_value in labels)
+            values.setdefault(name, {})[label] = value
+        
+        return {
+            'requests': latency.get('request_duration_seconds', {}),
+            'stages': latency.get('stage_duration_seconds', {}),
+            'counters': values
+        }
+
+metrics = Metrics(METRICS_LATENCY_BUCKETS)
+metrics.describe('request_duration_seconds', 'histogram', 'Request latency by Flask endpoint, until the response body is closed')
+metrics.describe('requests_total', 'counter', 'Requests by endpoint and status code')
+metrics.describe('stage_duration_seconds', 'histogram', 'Time spent per processing stage')
+metrics.describe('errors_total', 'counter', 'Errors by stage and exception type')
+metrics.describe('cache_requests_total', 'counter', 'Cache lookups by cache and result')
+metrics.describe('extractions_in_flight', 'gauge', 'yt-dlp extractions and subtitle fetches currently running')
+metrics.describe('extractions_coalesced_total', 'counter', 'Requests that joined an extraction already in flight')
+metrics.describe('extractor_pool_idle_workers', 'gauge', 'Warm yt-dlp worker processes waiting for a task')
+metrics.describe('extractor_pool_tasks_total', 'counter', 'Tasks completed by yt-dlp worker processes')
+metrics.describe('extractor_pool_recycled_total', 'counter', 'yt-dlp worker processes replaced, by reason')
+metrics.describe('jobs_queued', 'gauge', 'Jobs waiting in a worker queue')
+metrics.describe('jobs_running', 'gauge', 'Jobs currently running in a worker queue')
+metrics.describe('subtitle_cache_bytes', 'gauge', 'Bytes stored in the subtitle cache')
+metrics.describe('subtitle_cache_files', 'gauge', 'Artifacts stored in the subtitle cache')
+metrics.describe('subtitle_cache_evictions_total', 'counter', 'Subtitle cache evictions by reason')
+metrics.describe('boot_phase_seconds', 'gauge', 'Time spent in each startup phase of this process')
 
 # ===== DATABASE SETUP =====
+SUBTITLE_DOWNLOADS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS subtitle_downloads (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        video_id TEXT,
+        video_title TEXT,
+        video_url TEXT,
+        language TEXT,
+        format TEXT CHECK(format IN ('srt', 'txt', 'vtt', 'json', 'ass')),
+        file_size INTEGER,
+        download_count INTEGER DEFAULT 1,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        last_downloaded DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+# Proxy handed out by get_db(); close() returns the connection to the pool
+class PooledConnection:
+    def __init__(self, pool, conn):
+        self.pool = pool
+        self.conn = conn
+    
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+    
+    def __enter__(self):
+        self.conn.__enter__()
+        return self
+    
+    def __exit__(self, *exc_info):
+        return self.conn.__exit__(*exc_info)
+    
+    def close(self):
+        if self.conn is not None:
+            self.pool.release(self.conn)
+            self.conn = None
+
+# Long-lived WAL connections reused across requests and threads, so each one
+# keeps its prepared statement cache warm instead of reconnecting per query
+class ConnectionPool:
+    def __init__(self, path, max_idle):
+        self.path = path
+        self.idle = queue.LifoQueue(maxsize=max_idle)
+    
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=DB_BUSY_TIMEOUT, check_same_thread=False,
+                               cached_statements=DB_STATEMENT_CACHE_SIZE)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute(f'PRAGMA busy_timeout = {DB_BUSY_TIMEOUT * 1000}')
+        return conn
+    
+    def acquire(self):
+        try:
+            conn = self.idle.get_nowait()
+        except queue.Empty:
+            conn = self.connect()
+        return PooledConnection(self, conn)
+    
+    def release(self, conn):
+        try:
+            # Never hand out a connection with someone else's transaction open
+            if conn.in_transaction:
+                conn.rollback()
+            self.idle.put_nowait(conn)
+        except (queue.Full, sqlite3.Error):
+            conn.close()
+
+db_pool = ConnectionPool(DATABASE_PATH, DB_POOL_SIZE)
+
+def get_db():
+    return db_pool.acquire()
+
+# Returns False without touching the schema when an earlier worker (or
+# `flask init-db` at deploy time) already brought it up to date
 def init_db():
-    conn = sqlite3.connect('subtitle_app.db')
+    # Migrations scan the cache directory, so it must exist even for `flask init-db`
+    os.makedirs(SUBTITLE_CACHE_DIR, exist_ok=True)
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    
+    conn = get_db()
+    try:
+        if conn.execute('PRAGMA user_version').fetchone()[0] >= len(MIGRATIONS):
+            return False
+        create_schema(conn)
+        migrate_db(conn)
+        return True
+    finally:
+        conn.close()
+
+def create_schema(conn):
     cursor = conn.cursor()
     
     # Visitors table
@@ -91,45 +439,294 @@ def init_db():
     ''')
     
     # Subtitle downloads tracking
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS subtitle_downloads (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            video_id TEXT,
-            video_title TEXT,
-            video_url TEXT,
-            language TEXT,
-            format TEXT CHECK(format IN ('srt', 'txt')),
-            file_size INTEGER,
-            download_count INTEGER DEFAULT 1,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            last_downloaded DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
+    cursor.execute(SUBTITLE_DOWNLOADS_SCHEMA)
     
     # Insert default settings
     default_settings = [
         ('admin_username', 'admin', 'Admin username'),
-        ('admin_password_hash', generate_password_hash('admin123'), 'Admin password hash'),
         ('site_title', 'YouTube Subtitle Downloader', 'Site title'),
         ('maintenance_mode', 'false', 'Maintenance mode')
     ]
     
+    # Password hashing is deliberately slow; only pay for it on a fresh database
+    if not cursor.execute("SELECT 1 FROM settings WHERE key = 'admin_password_hash'").fetchone():
+        default_settings.append(('admin_password_hash', generate_password_hash('admin123'), 'Admin password hash'))
+    
     for key, value, desc in default_settings:
         cursor.execute('INSERT OR IGNORE INTO settings (key, value, description) VALUES (?, ?, ?)', 
                       (key, value, desc))
     
     conn.commit()
-    conn.close()
 
-# Initialize database
-init_db()
+# ===== COMPRESSED FILES =====
+# Fixed mtime keeps the gzip bytes identical for identical content
+@contextmanager
+def open_gzip_writer(path):
+    with open(path, 'wb') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=SUBTITLE_CACHE_COMPRESS_LEVEL, mtime=0) as f:
+            yield f
+
+def open_cached_text(path):
+    return gzip.open(path, 'rt', encoding='utf-8')
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Uncompressed size from the gzip trailer, without inflating the file
+def get_uncompressed_size(path):
+    with open(path, 'rb') as f:
+        f.seek(-4, os.SEEK_END)
+        return int.from_bytes(f.read(4), 'little')
+
+# ===== SCHEMA MIGRATIONS =====
+# Applied in order; PRAGMA user_version records how many have run
+def migrate_subtitle_formats(cursor):
+    # Older databases only allowed srt/txt; SQLite can't alter a CHECK, so rebuild
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'subtitle_downloads'")
+    if "'vtt'" in cursor.fetchone()[0]:
+        return
+    
+    cursor.execute('ALTER TABLE subtitle_downloads RENAME TO subtitle_downloads_old')
+    cursor.execute(SUBTITLE_DOWNLOADS_SCHEMA)
+    cursor.execute('INSERT INTO subtitle_downloads SELECT * FROM subtitle_downloads_old')
+    cursor.execute('DROP TABLE subtitle_downloads_old')
+
+def migrate_download_and_visitor_indexes(cursor):
+    # Fold duplicate rows left by the old SELECT-then-INSERT race into the oldest one
+    cursor.execute('''
+        UPDATE subtitle_downloads
+        SET download_count = (
+                SELECT SUM(d.download_count) FROM subtitle_downloads d
+                WHERE d.video_id = subtitle_downloads.video_id
+                  AND d.language = subtitle_downloads.language
+                  AND d.format = subtitle_downloads.format
+            ),
+            last_downloaded = (
+                SELECT MAX(d.last_downloaded) FROM subtitle_downloads d
+                WHERE d.video_id = subtitle_downloads.video_id
+                  AND d.language = subtitle_downloads.language
+                  AND d.format = subtitle_downloads.format
+            )
+        WHERE id IN (
+            SELECT MIN(id) FROM subtitle_downloads
+            GROUP BY video_id, language, format
+            HAVING COUNT(*) > 1
+        )
+    ''')
+    cursor.execute('''
+        DELETE FROM subtitle_downloads
+        WHERE id NOT IN (SELECT MIN(id) FROM subtitle_downloads GROUP BY video_id, language, format)
+    ''')
+    
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_subtitle_downloads_video_language_format
+        ON subtitle_downloads (video_id, language, format)
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_visitors_last_activity ON visitors (last_activity)')
+
+def migrate_cache_versions(cursor):
+    # Bumped on writes so every process can tell when its in-memory copy is stale
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+def migrate_cache_ledger(cursor):
+    # Ledger of subtitle cache artifacts; triggers keep the totals row current so
+    # cache stats never need a directory scan or a full-table aggregate
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cache_entries (
+            key TEXT PRIMARY KEY,
+            filename TEXT NOT NULL,
+            video_id TEXT,
+            language TEXT,
+            kind TEXT,
+            format TEXT,
+            size INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_cache_entries_created_at ON cache_entries (created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_cache_entries_last_access ON cache_entries (last_access)')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cache_totals (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total_files INTEGER NOT NULL DEFAULT 0,
+            total_size INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO cache_totals (id) VALUES (1)')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS cache_entries_insert AFTER INSERT ON cache_entries BEGIN
+            UPDATE cache_totals SET total_files = total_files + 1, total_size = total_size + NEW.size WHERE id = 1;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS cache_entries_delete AFTER DELETE ON cache_entries BEGIN
+            UPDATE cache_totals SET total_files = total_files - 1, total_size = total_size - OLD.size WHERE id = 1;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS cache_entries_update AFTER UPDATE OF size ON cache_entries BEGIN
+            UPDATE cache_totals SET total_size = total_size - OLD.size + NEW.size WHERE id = 1;
+        END
+    ''')
+    
+    # Adopt whatever is already on disk, using the old JSON index for keys where it has them
+    index_path = os.path.join(SUBTITLE_CACHE_DIR, SUBTITLE_CACHE_LEGACY_INDEX)
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            legacy_index = {entry['filename']: (key, entry['created']) for key, entry in json.load(f).items()}
+    except (OSError, ValueError, KeyError, TypeError):
+        legacy_index = {}
+    
+    for entry in os.scandir(SUBTITLE_CACHE_DIR):
+        if not entry.is_file() or entry.name == SUBTITLE_CACHE_LEGACY_INDEX or entry.name.endswith('.tmp'):
+            continue
+        
+        stat = entry.stat()
+        key, created_at = legacy_index.get(entry.name, (f"file:{entry.name}", stat.st_mtime))
+        parts = key.split(':')
+        if len(parts) != 4:
+            parts = [None] * 4
+        cursor.execute('''
+            INSERT OR IGNORE INTO cache_entries
+            (key, filename, video_id, language, kind, format, size, created_at, last_access)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (key, entry.name, *parts, stat.st_size, created_at, stat.st_mtime))
+    
+    if os.path.exists(index_path):
+        os.remove(index_path)
+
+def migrate_compress_cache(cursor):
+    # Cache artifacts are now stored gzip-compressed; convert the ones already on disk
+    cursor.execute("SELECT key, filename FROM cache_entries WHERE filename NOT LIKE '%.gz'")
+    for key, filename in cursor.fetchall():
+        file_path = os.path.join(SUBTITLE_CACHE_DIR, filename)
+        if not os.path.exists(file_path):
+            cursor.execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+            continue
+        
+        with open(file_path, 'rb') as src, open_gzip_writer(file_path + '.gz') as dst:
+            shutil.copyfileobj(src, dst)
+        cursor.execute('UPDATE cache_entries SET filename = ?, size = ? WHERE key = ?',
+                       (filename + '.gz', os.path.getsize(file_path + '.gz'), key))
+        os.remove(file_path)
+
+def migrate_cache_etags(cursor):
+    # Content hash per artifact for download validators, looked up by filename
+    cursor.execute('ALTER TABLE cache_entries ADD COLUMN etag TEXT')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_cache_entries_filename ON cache_entries (filename)')
+    
+    cursor.execute('SELECT key, filename FROM cache_entries')
+    for key, filename in cursor.fetchall():
+        file_path = os.path.join(SUBTITLE_CACHE_DIR, filename)
+        if os.path.exists(file_path):
+            cursor.execute('UPDATE cache_entries SET etag = ? WHERE key = ?', (hash_file(file_path), key))
+
+MIGRATIONS = [
+    migrate_subtitle_formats,
+    migrate_download_and_visitor_indexes,
+    migrate_cache_versions,
+    migrate_cache_ledger,
+    migrate_compress_cache,
+    migrate_cache_etags,
+]
+
+def migrate_db(conn):
+    cursor = conn.cursor()
+    
+    # IMMEDIATE takes the write lock up front so concurrent workers migrate one at a time
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        version = cursor.execute('PRAGMA user_version').fetchone()[0]
+        for number, migration in enumerate(MIGRATIONS[version:], version + 1):
+            migration(cursor)
+            cursor.execute(f'PRAGMA user_version = {number}')
+            logger.info(f"Applied schema migration {number}: {migration.__name__}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
 
 # ===== VISITOR TRACKING =====
+# Approximate distinct counter over a sliding window: a ring of HyperLogLog
+# sketches, one per time bucket. Updates are O(1) and memory is fixed at
+# (window / bucket + 1) * 2^precision bytes no matter how many visitors arrive.
+class SlidingWindowCounter:
+    def __init__(self, window_seconds, bucket_seconds, precision=12):
+        self.bucket_seconds = bucket_seconds
+        self.num_buckets = window_seconds // bucket_seconds + 1
+        self.precision = precision
+        self.num_registers = 1 << precision
+        self.alpha = 0.7213 / (1 + 1.079 / self.num_registers)
+        self.lock = threading.Lock()
+        self.buckets = [bytearray(self.num_registers) for _ in range(self.num_buckets)]
+        self.bucket_ids = [-1] * self.num_buckets
+    
+    def add(self, key, now=None):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+        value = int.from_bytes(digest, 'big')
+        index = value & (self.num_registers - 1)
+        rank = 64 - self.precision - (value >> self.precision).bit_length() + 1
+        
+        bucket_id = int((now or time.time()) // self.bucket_seconds)
+        slot = bucket_id % self.num_buckets
+        
+        with self.lock:
+            if self.bucket_ids[slot] != bucket_id:
+                self.buckets[slot] = bytearray(self.num_registers)
+                self.bucket_ids[slot] = bucket_id
+            
+            registers = self.buckets[slot]
+            if registers[index] < rank:
+                registers[index] = rank
+    
+    def count(self, seconds, now=None):
+        current = int((now or time.time()) // self.bucket_seconds)
+        oldest = current - min(self.num_buckets - 1, -(-seconds // self.bucket_seconds))
+        
+        merged = bytes(self.num_registers)
+        with self.lock:
+            for slot, bucket_id in enumerate(self.bucket_ids):
+                if oldest <= bucket_id <= current:
+                    merged = bytes(map(max, merged, self.buckets[slot]))
+        
+        estimate = self.alpha * self.num_registers ** 2 / sum(2.0 ** -rank for rank in merged)
+        zeros = merged.count(0)
+        
+        # Linear counting is far more accurate for small cardinalities
+        if estimate <= 2.5 * self.num_registers and zeros:
+            estimate = self.num_registers * math.log(self.num_registers / zeros)
+        
+        return int(round(estimate))
+
 class VisitorTracker:
-    def __init__(self):
-        self.active_visitors = {}
+    def __init__(self, flush_interval_ms, flush_max_events):
+        self.active_visitors = SlidingWindowCounter(ACTIVE_VISITOR_WINDOW, ACTIVE_VISITOR_BUCKET)
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_max_events = flush_max_events
+        # Pending visits coalesced per session; the request path only touches this
+        self.pending = {}
+        self.pending_events = 0
+        self.pending_lock = threading.Lock()
+        self.flush_requested = threading.Event()
+        self.flush_lock = threading.Lock()
+    
+    def start(self):
         self.cleanup_thread = threading.Thread(target=self.cleanup_inactive_visitors, daemon=True)
         self.cleanup_thread.start()
+        self.flush_thread = threading.Thread(target=self.flush_loop, daemon=True)
+        self.flush_thread.start()
+        atexit.register(self.flush)
     
     def track_visitor(self, request):
         session_id = session.get('session_id')
@@ -137,45 +734,79 @@ class VisitorTracker:
             session_id = str(uuid.uuid4())
             session['session_id'] = session_id
         
-        ip_address = request.remote_addr
-        user_agent = request.headers.get('User-Agent', '')
         current_time = datetime.now()
+        self.active_visitors.add(session_id)
         
-        self.active_visitors[session_id] = current_time
-        
-        conn = sqlite3.connect('subtitle_app.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT id, page_views FROM visitors WHERE session_id = ?', (session_id,))
-        visitor = cursor.fetchone()
-        
-        if visitor:
-            cursor.execute('''
-                UPDATE visitors 
-                SET last_activity = ?, page_views = page_views + 1, is_active = 1
-                WHERE session_id = ?
-            ''', (current_time, session_id))
-        else:
-            cursor.execute('''
-                INSERT INTO visitors (session_id, ip_address, user_agent, first_visit, last_activity)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (session_id, ip_address, user_agent, current_time, current_time))
-        
-        conn.commit()
-        conn.close()
+        with self.pending_lock:
+            visit = self.pending.get(session_id)
+            if visit:
+                visit['last_activity'] = current_time
+                visit['page_views'] += 1
+            else:
+                self.pending[session_id] = {
+                    'ip_address': request.remote_addr,
+                    'user_agent': request.headers.get('User-Agent', ''),
+                    'first_visit': current_time,
+                    'last_activity': current_time,
+                    'page_views': 1
+                }
+            self.pending_events += 1
+            
+            if self.pending_events >= self.flush_max_events:
+                self.flush_requested.set()
         
         return session_id
     
-    def get_active_count(self):
-        current_time = datetime.now()
-        cutoff_time = current_time - timedelta(minutes=5)
-        
-        self.active_visitors = {
-            sid: last_activity for sid, last_activity in self.active_visitors.items()
-            if last_activity > cutoff_time
-        }
-        
-        return len(self.active_visitors)
+    def flush_loop(self):
+        while True:
+            self.flush_requested.wait(self.flush_interval)
+            self.flush_requested.clear()
+            self.flush()
+    
+    def flush(self):
+        # flush_lock keeps the shutdown flush from racing the background one
+        with self.flush_lock:
+            with self.pending_lock:
+                pending = self.pending
+                self.pending = {}
+                self.pending_events = 0
+            
+            if not pending:
+                return
+            
+            try:
+                with metrics.timer('db_write'):
+                    conn = get_db()
+                    with conn:
+                        conn.executemany('''
+                            INSERT INTO visitors (session_id, ip_address, user_agent, first_visit, last_activity, page_views)
+                            VALUES (?, ?, ?, ?, ?, ?)
+                            ON CONFLICT(session_id) DO UPDATE SET
+                                last_activity = excluded.last_activity,
+                                page_views = page_views + excluded.page_views,
+                                is_active = 1
+                        ''', [
+                            (session_id, visit['ip_address'], visit['user_agent'], visit['first_visit'],
+                             visit['last_activity'], visit['page_views'])
+                            for session_id, visit in pending.items()
+                        ])
+                    conn.close()
+                
+            except Exception as e:
+                logger.error(f"Visitor flush error: {e}")
+                # Put the visits back so the next timed flush retries them, merged
+                # with anything tracked for the same session in the meantime
+                with self.pending_lock:
+                    for session_id, visit in pending.items():
+                        newer = self.pending.get(session_id)
+                        if newer:
+                            newer['first_visit'] = visit['first_visit']
+                            newer['page_views'] += visit['page_views']
+                        else:
+                            self.pending[session_id] = visit
+    
+    def get_active_count(self, minutes=5):
+        return self.active_visitors.count(minutes * 60)
     
     def cleanup_inactive_visitors(self):
         while True:
@@ -184,7 +815,7 @@ class VisitorTracker:
                 current_time = datetime.now()
                 cutoff_time = current_time - timedelta(minutes=10)
                 
-                conn = sqlite3.connect('subtitle_app.db')
+                conn = get_db()
                 cursor = conn.cursor()
                 cursor.execute('UPDATE visitors SET is_active = 0 WHERE last_activity < ?', (cutoff_time,))
                 conn.commit()
@@ -193,32 +824,908 @@ class VisitorTracker:
             except Exception as e:
                 logger.error(f"Visitor cleanup error: {e}")
 
-visitor_tracker = VisitorTracker()
+visitor_tracker = VisitorTracker(VISITOR_FLUSH_INTERVAL_MS, VISITOR_FLUSH_MAX_EVENTS)
 
-# ===== YOUTUBE SUBTITLE EXTRACTOR =====
-class YouTubeSubtitleExtractor:
+# ===== SUBTITLE CACHE =====
+# Converted subtitles keyed by (video_id, language, kind, format), stored under
+# a stable filename and tracked in the cache_entries ledger
+class SubtitleCache:
+    KINDS = ('manual', 'auto')
+
+    def __init__(self, cache_dir, ttl, maintenance_interval, max_bytes, max_files):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.maintenance_interval = maintenance_interval
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        # Hits only bump last_access in memory; the maintenance thread writes them back
+        self.lock = threading.Lock()
+        self.pending_access = {}
+        self.evictions = {'lru': 0, 'expired': 0, 'manual': 0}
+        self.recent_evictions = deque(maxlen=100000)
+
+    def start(self):
+        self.maintenance_thread = threading.Thread(target=self.maintenance_loop, daemon=True)
+        self.maintenance_thread.start()
+        atexit.register(self.flush_access)
+
+    @staticmethod
+    def make_key(video_id, language, kind, format):
+        return f"{video_id}:{language}:{kind}:{format}"
+
+    @staticmethod
+    def make_filename(video_id, language, kind, format):
+        return secure_filename(f"{video_id}_{language}_{kind}.{format}.gz")
+
+    def get(self, video_id, language, format):
+        return self.lookup(video_id, language, format)[1]
+
+    def lookup(self, video_id, language, format):
+        keys = [self.make_key(video_id, language, kind, format) for kind in self.KINDS]
+        
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute('SELECT key, kind, filename, created_at FROM cache_entries WHERE key IN (?, ?)', keys)
+        entries = {row[0]: row for row in cursor.fetchall()}
+        conn.close()
+        
+        # Manual subtitles win over auto captions, same as yt-dlp does
+        for key in keys:
+            if key not in entries:
+                continue
+            
+            _, kind, filename, created_at = entries[key]
+            file_path = os.path.join(self.cache_dir, filename)
+            if time.time() - created_at > self.ttl or not os.path.exists(file_path):
+                self.evict(key, filename, 'expired')
+                continue
+            
+            with self.lock:
+                self.pending_access[key] = time.time()
+            metrics.inc('cache_requests_total', cache='subtitle', result='hit')
+            return kind, file_path
+        
+        metrics.inc('cache_requests_total', cache='subtitle', result='miss')
+        return None, None
+
+    def put(self, video_id, language, kind, format, content):
+        with self.writer(video_id, language, kind, format) as f:
+            f.write(content)
+        
+        return os.path.join(self.cache_dir, self.make_filename(video_id, language, kind, format))
+
+    @contextmanager
+    def writer(self, video_id, language, kind, format):
+        filename = self.make_filename(video_id, language, kind, format)
+        file_path = os.path.join(self.cache_dir, filename)
+        
+        # Write to a temp file first so readers never see a partial artifact;
+        # compress once here so every later hit is served without recompressing
+        tmp_path = f"{file_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open_gzip_writer(tmp_path) as gz, io.TextIOWrapper(gz, encoding='utf-8') as f:
+                yield f
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            # Also covers GeneratorExit when a streaming client disconnects. The
+            # temp file may never have been created, e.g. if the cache dir is gone
+            with suppress(FileNotFoundError):
+                os.remove(tmp_path)
+            raise
+        
+        with metrics.timer('db_write'):
+            now = time.time()
+            conn = get_db()
+            conn.execute('''
+                INSERT INTO cache_entries
+                (key, filename, video_id, language, kind, format, size, etag, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    filename = excluded.filename,
+                    size = excluded.size,
+                    etag = excluded.etag,
+                    created_at = excluded.created_at,
+                    last_access = excluded.last_access
+            ''', (self.make_key(video_id, language, kind, format), filename, video_id, language, kind, format,
+                  os.path.getsize(file_path), hash_file(file_path), now, now))
+            conn.commit()
+            conn.close()
+
+    def get_etag(self, filename):
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute('SELECT etag FROM cache_entries WHERE filename = ?', (filename,))
+        row = cursor.fetchone()
+        conn.close()
+        
+        if row and row[0]:
+            return row[0]
+        return hash_file(os.path.join(self.cache_dir, filename))
+
+    def remove_file(self, filename):
+        try:
+            os.remove(os.path.join(self.cache_dir, filename))
+            return True
+        except OSError:
+            return False
+
+    def record_evictions(self, reason, count):
+        now = time.time()
+        with self.lock:
+            self.evictions[reason] += count
+            self.recent_evictions.extend([now] * count)
+
+    def evict(self, key, filename, reason='manual'):
+        self.remove_file(filename)
+        
+        conn = get_db()
+        conn.execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+        conn.commit()
+        conn.close()
+        self.record_evictions(reason, 1)
+
+    def evict_entries(self, cursor, entries, reason):
+        deleted_count = sum(1 for _, filename in entries if self.remove_file(filename))
+        cursor.executemany('DELETE FROM cache_entries WHERE key = ?', [(key,) for key, _ in entries])
+        self.record_evictions(reason, len(entries))
+        return deleted_count
+
+    def evict_where(self, condition, params=(), reason='manual'):
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT key, filename FROM cache_entries WHERE {condition}', params)
+        deleted_count = self.evict_entries(cursor, cursor.fetchall(), reason)
+        conn.commit()
+        conn.close()
+        
+        return deleted_count
+
+    def evict_older_than(self, cutoff, reason='manual'):
+        return self.evict_where('created_at < ?', (cutoff,), reason)
+
+    def clear(self):
+        return self.evict_where('1 = 1')
+
+    def enforce_budget(self):
+        # Walk the least recently used entries until both budgets are met again
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute('SELECT total_files, total_size FROM cache_totals WHERE id = 1')
+        total_files, total_size = cursor.fetchone()
+        
+        excess_files = total_files - self.max_files
+        excess_bytes = total_size - self.max_bytes
+        if excess_files <= 0 and excess_bytes <= 0:
+            conn.close()
+            return 0
+        
+        victims = []
+        cursor.execute('SELECT key, filename, size FROM cache_entries ORDER BY last_access')
+        for key, filename, size in cursor:
+            if excess_files <= 0 and excess_bytes <= 0:
+                break
+            victims.append((key, filename))
+            excess_files -= 1
+            excess_bytes -= size
+        
+        deleted_count = self.evict_entries(cursor, victims, 'lru')
+        conn.commit()
+        conn.close()
+        
+        return deleted_count
+
+    def get_stats(self):
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute('SELECT total_files, total_size FROM cache_totals WHERE id = 1')
+        total_files, total_size = cursor.fetchone()
+        conn.close()
+        
+        with self.lock:
+            evictions = dict(self.evictions)
+            cutoff = time.time() - 3600
+            while self.recent_evictions and self.recent_evictions[0] < cutoff:
+                self.recent_evictions.popleft()
+            evictions_last_hour = len(self.recent_evictions)
+        
+        return {
+            'total_files': total_files,
+            'total_size': total_size,
+            'max_files': self.max_files,
+            'max_bytes': self.max_bytes,
+            'evictions': evictions,
+            'evictions_last_hour': evictions_last_hour
+        }
+
+    def flush_access(self):
+        with self.lock:
+            pending = self.pending_access
+            self.pending_access = {}
+        
+        if not pending:
+            return
+        
+        conn = get_db()
+        conn.executemany('UPDATE cache_entries SET last_access = MAX(last_access, ?) WHERE key = ?',
+                         [(accessed_at, key) for key, accessed_at in pending.items()])
+        conn.commit()
+        conn.close()
+
+    def maintenance_loop(self):
+        while True:
+            time.sleep(self.maintenance_interval)
+            try:
+                # Flush hits first so recently served artifacts are not picked as LRU victims
+                self.flush_access()
+                self.evict_older_than(time.time() - self.ttl, 'expired')
+                self.enforce_budget()
+            except Exception as e:
+                logger.error(f"Subtitle cache maintenance error: {e}")
+
+subtitle_cache = SubtitleCache(
+    SUBTITLE_CACHE_DIR,
+    SUBTITLE_CACHE_TTL,
+    SUBTITLE_CACHE_MAINTENANCE_INTERVAL,
+    SUBTITLE_CACHE_MAX_BYTES,
+    SUBTITLE_CACHE_MAX_FILES
+)
+
+# ===== VIDEO INFO CACHE =====
+# Bounded in-process cache for yt-dlp metadata with TTL and LRU eviction
+class TTLCache:
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            stored_at, value = entry
+            if time.time() - stored_at > self.ttl:
+                del self.entries[key]
+                self.misses += 1
+                return None
+            
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.time(), value)
+            self.entries.move_to_end(key)
+            
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+    
+    def pop(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+    
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+    
+    def get_stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / total, 3) if total else 0
+            }
+
+video_info_cache = TTLCache(VIDEO_INFO_CACHE_SIZE, VIDEO_INFO_CACHE_TTL)
+# Caption track URLs from the same extraction, kept out of the client-facing info
+subtitle_track_cache = TTLCache(VIDEO_INFO_CACHE_SIZE, VIDEO_INFO_CACHE_TTL)
+
+# ===== SINGLE-FLIGHT =====
+# Concurrent callers with the same key share one in-flight call and all
+# receive its result or exception
+class SingleFlight:
     def __init__(self):
-        self.setup_ytdlp()
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.coalesced = 0
+    
+    def do(self, key, fn, *args, **kwargs):
+        with self.lock:
+            call = self.calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = {'done': threading.Event(), 'result': None, 'error': None}
+                self.calls[key] = call
+            else:
+                self.coalesced += 1
+        
+        if not is_leader:
+            call['done'].wait()
+            if call['error']:
+                raise call['error']
+            return call['result']
+        
+        try:
+            call['result'] = fn(*args, **kwargs)
+            return call['result']
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call['done'].set()
     
+    def get_stats(self):
+        with self.lock:
+            return {'in_flight': len(self.calls), 'coalesced': self.coalesced}
+
+extraction_flight = SingleFlight()
+
+# ===== VTT PARSING =====
+VTT_TAG_PATTERN = re.compile(r'<[^>]+>')
+VTT_TIMING_PATTERN = re.compile(r'((?:\d+:)?\d+:\d+\.\d+)\s*-->\s*((?:\d+:)?\d+:\d+\.\d+)')
+SENTENCE_END_PATTERN = re.compile(r'[.!?]+\s+')
+CUES_FORMAT = 'cues'
+
+# Single pass over a WebVTT line stream yielding (start, end, text_lines) per cue.
+# Cue settings and inline tags are stripped; headers, NOTE/STYLE blocks and cue
+# identifiers are skipped, so it can be fed straight from a file or response.
+def iter_vtt_cues(lines):
+    cue = None
+    
+    for line in lines:
+        line = line.strip()
+        
+        timing = VTT_TIMING_PATTERN.search(line) if '-->' in line else None
+        if timing:
+            if cue and cue[2]:
+                yield cue
+            cue = (timing.group(1), timing.group(2), [])
+        elif not line:
+            if cue and cue[2]:
+                yield cue
+            cue = None
+        elif cue:
+            clean_text = VTT_TAG_PATTERN.sub('', line).strip()
+            if clean_text:
+                cue[2].append(clean_text)
+    
+    if cue and cue[2]:
+        yield cue
+
+def serialize_cues(cues):
+    return json.dumps(cues, ensure_ascii=False, separators=(',', ':'))
+
+# Renderers turn cues into output chunks as they arrive; joined, the chunks
+# form the complete document
+def render_srt(cues):
+    seen_texts = set()
+    
+    for start, end, text_lines in cues:
+        full_text = ' '.join(text_lines)
+        if full_text in seen_texts:
+            continue
+        
+        separator = '\n' if seen_texts else ''
+        seen_texts.add(full_text)
+        timing = f"{start} --> {end}".replace('.', ',')
+        yield f"{separator}{len(seen_texts)}\n{timing}\n{full_text}\n"
+
+def render_txt(cues):
+    seen_lines = set()
+    seen_sentences = set()
+    pending_lines = []
+    
+    def take_sentences(parts):
+        for sentence in parts:
+            sentence = sentence.strip()
+            if sentence and sentence not in seen_sentences:
+                separator = '\n' if seen_sentences else ''
+                seen_sentences.add(sentence)
+                yield f"{separator}{sentence}"
+    
+    for _, _, text_lines in cues:
+        for line in text_lines:
+            if line in seen_lines:
+                continue
+            
+            seen_lines.add(line)
+            
+            # Auto captions often have no punctuation at all, so only re-split
+            # once a break can exist: inside the new line or where it joins
+            boundary = pending_lines and pending_lines[-1][-1] in '.!?'
+            pending_lines.append(line)
+            if not boundary and not SENTENCE_END_PATTERN.search(line):
+                continue
+            
+            # Everything before the last sentence break is final
+            parts = SENTENCE_END_PATTERN.split(' '.join(pending_lines))
+            pending_lines = [parts.pop()] if parts[-1] else []
+            yield from take_sentences(parts)
+    
+    yield from take_sentences([' '.join(pending_lines)])
+
+def render_vtt(cues):
+    yield 'WEBVTT\n'
+    
+    for start, end, text_lines in cues:
+        text = '\n'.join(text_lines)
+        yield f"\n{start} --> {end}\n{text}\n"
+
+def render_json(cues):
+    yield '['
+    
+    for index, (start, end, text_lines) in enumerate(cues):
+        cue = json.dumps({'start': start, 'end': end, 'text': '\n'.join(text_lines)}, ensure_ascii=False)
+        yield f",{cue}" if index else cue
+    
+    yield ']'
+
+ASS_HEADER = """[Script Info]
+ScriptType: v4.00+
+PlayResX: 384
+PlayResY: 288
+WrapStyle: 0
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Default,Arial,16,&H00FFFFFF,&H000000FF,&H00000000,&H80000000,0,0,0,0,100,100,0,0,1,1,0,2,10,10,10,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+
+def format_ass_time(timestamp):
+    parts = timestamp.split(':')
+    seconds = float(parts[-1]) + int(parts[-2]) * 60
+    if len(parts) > 2:
+        seconds += int(parts[-3]) * 3600
+    
+    centiseconds = int(round(seconds * 100))
+    hours, centiseconds = divmod(centiseconds, 360000)
+    minutes, centiseconds = divmod(centiseconds, 6000)
+    return f"{hours}:{minutes:02d}:{centiseconds // 100:02d}.{centiseconds % 100:02d}"
+
+def render_ass(cues):
+    yield ASS_HEADER
+    seen_texts = set()
+    
+    # Same rolling-caption dedupe as SRT, both are display formats
+    for start, end, text_lines in cues:
+        full_text = ' '.join(text_lines)
+        if full_text in seen_texts:
+            continue
+        
+        seen_texts.add(full_text)
+        text = '\\N'.join(text_lines)
+        yield f"Dialogue: 0,{format_ass_time(start)},{format_ass_time(end)},Default,,0,0,0,,{text}\n"
+
+SUBTITLE_RENDERERS = {
+    'srt': render_srt,
+    'txt': render_txt,
+    'vtt': render_vtt,
+    'json': render_json,
+    'ass': render_ass,
+}
+
+SUBTITLE_MIMETYPES = {
+    'srt': 'application/x-subrip',
+    'txt': 'text/plain',
+    'vtt': 'text/vtt',
+    'json': 'application/json',
+    'ass': 'text/x-ssa',
+}
+
+def iter_chunks(pieces, chunk_size=STREAM_CHUNK_SIZE):
+    buffer = []
+    buffered = 0
+    
+    for piece in pieces:
+        buffer.append(piece)
+        buffered += len(piece)
+        if buffered >= chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+            buffered = 0
+    
+    if buffer:
+        yield ''.join(buffer)
+
+# ===== EXTRACTOR BACKENDS =====
+# A backend answers two questions: the yt-dlp info dict for a URL (video or
+# flat playlist) and the body of a caption track listed in that dict. Track
+# bodies come back as text, or with stream=True as an object with
+# iter_lines(decode_unicode=True) and close(), like a streamed requests response.
+class ExtractorBackend:
+    name = 'base'
+    available = True
+
+    def extract_info(self, url):
+        raise NotImplementedError
+
+    def extract_playlist(self, url, limit):
+        raise NotImplementedError
+
+    def fetch_track(self, track, stream=False):
+        response = http_session.get(track['url'], headers=track.get('http_headers'),
+                                    timeout=HTTP_TIMEOUT, stream=stream)
+        response.raise_for_status()
+        response.encoding = 'utf-8'
+        return response if stream else response.text
+
+class YtDlpBackend(ExtractorBackend):
+    name = 'ytdlp'
+
+    def __init__(self):
+        self.setup_ytdlp()
+
     def setup_ytdlp(self):
         try:
             import yt_dlp
-            self.ytdlp_available = True
+            self.available = True
             logger.info("✅ yt-dlp is available")
         except ImportError:
             logger.info("⚠️ Installing yt-dlp...")
             try:
                 subprocess.check_call([sys.executable, "-m", "pip", "install", "yt-dlp"])
                 import yt_dlp
-                self.ytdlp_available = True
+                self.available = True
                 logger.info("✅ yt-dlp installed successfully")
             except Exception as e:
                 logger.error(f"❌ Failed to install yt-dlp: {e}")
-                self.ytdlp_available = False
+                self.available = False
+
+    def run(self, url, **options):
+        import yt_dlp
+        
+        ydl_opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'skip_download': True,
+            **options
+        }
+        
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            return ydl.extract_info(url, download=False)
+
+    def extract_info(self, url):
+        return self.run(url, writesubtitles=True, writeautomaticsub=True)
+
+    def extract_playlist(self, url, limit):
+        return self.run(url, extract_flat='in_playlist', playlistend=limit)
+
+# One long-lived worker process running ytdlp_worker.py, talking pickled
+# messages over a socketpair. Started as a plain script rather than through
+# multiprocessing so the child never re-imports this module as __main__.
+class PoolWorker:
+    def __init__(self, http_timeout):
+        parent_sock, child_sock = socket.socketpair()
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(ytdlp_worker.__file__), str(child_sock.fileno()), str(http_timeout)],
+            pass_fds=(child_sock.fileno(),)
+        )
+        child_sock.close()
+        self.conn = multiprocessing.connection.Connection(parent_sock.detach())
+        self.ready = False
+        self.tasks = 0
+
+    def wait_ready(self, timeout):
+        if not self.conn.poll(timeout):
+            raise TimeoutError(f"yt-dlp worker did not start within {timeout}s")
+        
+        try:
+            status, detail = self.conn.recv()
+        except (EOFError, OSError):
+            raise RuntimeError("yt-dlp worker exited during startup")
+        if status != 'ready':
+            # The worker could not import yt-dlp or requests
+            raise ImportError(f"yt-dlp worker failed to start: {detail}")
+        self.ready = True
+
+    def call(self, method, args, timeout):
+        self.tasks += 1
+        self.conn.send((method, args))
+        if not self.conn.poll(timeout):
+            raise TimeoutError(f"yt-dlp worker timed out after {timeout}s")
+        # Raises EOFError if the process died mid-task
+        return self.conn.recv()
+
+    def stop(self, graceful=True):
+        if graceful:
+            try:
+                self.conn.send(None)
+                self.process.wait(1)
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+        
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self.conn.close()
+
+# Warm pool of yt-dlp worker processes: each imports yt-dlp once and reuses
+# its YoutubeDL instances, so extraction runs on other cores instead of
+# holding this interpreter's GIL. Workers that time out or crash are killed
+# and replaced, and each is recycled after max_tasks calls.
+class ProcessPoolYtDlpBackend(ExtractorBackend):
+    name = 'pool'
+
+    def __init__(self, size, task_timeout, start_timeout, max_tasks):
+        self.size = size
+        self.task_timeout = task_timeout
+        self.start_timeout = start_timeout
+        self.max_tasks = max_tasks
+        self.slots = threading.BoundedSemaphore(size)
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.tasks = 0
+        self.recycled = {'max_tasks': 0, 'timeout': 0, 'crash': 0}
+        
+        # Workers run this interpreter, so a missing yt-dlp is known up front
+        if importlib.util.find_spec('yt_dlp') is None:
+            logger.error("❌ yt-dlp is not installed, the worker pool is unavailable")
+            self.available = False
+            return
+        
+        # Workers boot (and import yt-dlp) in parallel while the app starts
+        for _ in range(size):
+            self.idle.put(PoolWorker(HTTP_TIMEOUT))
+        atexit.register(self.shutdown)
+
+    def checkout(self):
+        while True:
+            try:
+                worker = self.idle.get_nowait()
+            except queue.Empty:
+                worker = PoolWorker(HTTP_TIMEOUT)
+                break
+            
+            # An idle worker may have been killed (OOM, segfault) while waiting;
+            # replace it here instead of failing a task that never ran
+            if worker.process.poll() is None:
+                break
+            self.retire(worker, 'crash')
+        
+        if not worker.ready:
+            try:
+                worker.wait_ready(self.start_timeout)
+            except ImportError as e:
+                # Every replacement would fail the same way: report it once and stop
+                worker.stop(graceful=False)
+                self.available = False
+                logger.error(f"❌ {e}")
+                raise RuntimeError(str(e))
+            except TimeoutError:
+                self.retire(worker, 'timeout')
+                raise
+            except RuntimeError:
+                self.retire(worker, 'crash')
+                raise
+        return worker
+
+    def retire(self, worker, reason):
+        with self.lock:
+            self.recycled[reason] += 1
+        worker.stop(graceful=reason == 'max_tasks')
+        # Start the replacement right away so it is warm by the next task
+        self.idle.put(PoolWorker(HTTP_TIMEOUT))
+
+    def call(self, method, *args):
+        if not self.available:
+            raise RuntimeError("yt-dlp not available")
+        
+        with self.slots:
+            worker = self.checkout()
+            try:
+                status, result = worker.call(method, args, self.task_timeout)
+            except TimeoutError:
+                self.retire(worker, 'timeout')
+                raise
+            except (EOFError, OSError):
+                self.retire(worker, 'crash')
+                raise RuntimeError("yt-dlp worker process crashed")
+            
+            with self.lock:
+                self.tasks += 1
+            
+            if worker.tasks >= self.max_tasks:
+                self.retire(worker, 'max_tasks')
+            else:
+                self.idle.put(worker)
+        
+        if status == 'ok':
+            return result
+        
+        error_type, message = result
+        if error_type == 'HTTPError':
+            # Keeps the expired-track-URL retry in open_track working
+            raise requests.HTTPError(message)
+        raise RuntimeError(message)
+
+    def extract_info(self, url):
+        return self.call('extract_info', url)
+
+    def extract_playlist(self, url, limit):
+        return self.call('extract_playlist', url, limit)
+
+    def fetch_track(self, track, stream=False):
+        text = self.call('fetch_track', {'url': track['url'], 'http_headers': track.get('http_headers')})
+        return TextTrack(io.StringIO(text)) if stream else text
+
+    def shutdown(self):
+        while True:
+            try:
+                self.idle.get_nowait().stop()
+            except queue.Empty:
+                break
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'size': self.size,
+                'idle': self.idle.qsize(),
+                'tasks': self.tasks,
+                'recycled': dict(self.recycled)
+            }
+
+# Runs the yt-dlp CLI in child processes, at most pool_size at a time, so the
+# parsing work happens outside this interpreter
+class SubprocessYtDlpBackend(ExtractorBackend):
+    name = 'subprocess'
+
+    def __init__(self, pool_size, timeout):
+        self.slots = threading.BoundedSemaphore(pool_size)
+        self.timeout = timeout
+        self.command = [sys.executable, '-m', 'yt_dlp']
+        
+        try:
+            subprocess.run(self.command + ['--version'], capture_output=True, check=True, timeout=timeout)
+            self.available = True
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.error(f"❌ yt-dlp CLI not available: {e}")
+            self.available = False
+
+    def run(self, url, *args):
+        with self.slots:
+            result = subprocess.run(
+                self.command + ['--dump-single-json', '--skip-download', '--no-warnings', *args, '--', url],
+                capture_output=True, text=True, timeout=self.timeout
+            )
+        
+        if result.returncode != 0:
+            # yt-dlp puts the useful message on the last stderr line
+            lines = result.stderr.strip().splitlines()
+            raise RuntimeError(lines[-1] if lines else f"yt-dlp exited with {result.returncode}")
+        
+        return json.loads(result.stdout)
+
+    def extract_info(self, url):
+        return self.run(url)
+
+    def extract_playlist(self, url, limit):
+        return self.run(url, '--flat-playlist', '--playlist-end', str(limit))
+
+# Serves recorded data from a fixture directory:
+#   <video_id>.info.json   info dict as written by `yt-dlp -J`
+#   _default.info.json     fallback for any other id ({id} in strings is replaced)
+#   <playlist_id>.playlist.json
+# Track URLs that aren't http(s) are read as files relative to the directory.
+class FakeExtractorBackend(ExtractorBackend):
+    name = 'fake'
+
+    def __init__(self, fixture_dir, latency):
+        self.fixture_dir = fixture_dir
+        self.latency = latency
+        self.available = os.path.isdir(fixture_dir)
+        if not self.available:
+            logger.error(f"❌ Extractor fixture directory not found: {fixture_dir}")
+
+    def load_json(self, filename):
+        with open(os.path.join(self.fixture_dir, filename), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def extract_info(self, url):
+        if self.latency:
+            time.sleep(self.latency)
+        
+        video_id = subtitle_extractor.extract_video_id(url)
+        if video_id and os.path.exists(os.path.join(self.fixture_dir, f"{video_id}.info.json")):
+            return self.load_json(f"{video_id}.info.json")
+        
+        if not video_id or not os.path.exists(os.path.join(self.fixture_dir, '_default.info.json')):
+            raise LookupError(f"Video unavailable: no fixture for {url}")
+        
+        with open(os.path.join(self.fixture_dir, '_default.info.json'), 'r', encoding='utf-8') as f:
+            return json.loads(f.read().replace('{id}', video_id))
+
+    def extract_playlist(self, url, limit):
+        if self.latency:
+            time.sleep(self.latency)
+        
+        playlist_id = subtitle_extractor.extract_playlist_id(url)
+        info = self.load_json(f"{playlist_id}.playlist.json")
+        info['entries'] = (info.get('entries') or [])[:limit]
+        return info
+
+    def fetch_track(self, track, stream=False):
+        if track['url'].startswith(('http://', 'https://')):
+            return super().fetch_track(track, stream)
+        
+        f = open(os.path.join(self.fixture_dir, track['url']), 'r', encoding='utf-8')
+        if not stream:
+            with f:
+                return f.read()
+        return TextTrack(f)
+
+# Line-by-line track body from any text file object
+class TextTrack:
+    def __init__(self, f):
+        self.f = f
+
+    def iter_lines(self, decode_unicode=True):
+        for line in self.f:
+            yield line.rstrip('\r\n')
+
+    def close(self):
+        self.f.close()
+
+def create_extractor_backend(name):
+    if name == 'ytdlp':
+        return YtDlpBackend()
+    if name == 'pool':
+        return ProcessPoolYtDlpBackend(EXTRACTOR_POOL_SIZE, EXTRACTOR_POOL_TASK_TIMEOUT,
+                                       EXTRACTOR_POOL_START_TIMEOUT, EXTRACTOR_POOL_MAX_TASKS)
+    if name == 'subprocess':
+        return SubprocessYtDlpBackend(EXTRACTOR_SUBPROCESS_POOL_SIZE, EXTRACTOR_SUBPROCESS_TIMEOUT)
+    if name == 'fake':
+        return FakeExtractorBackend(EXTRACTOR_FIXTURE_DIR, EXTRACTOR_FAKE_LATENCY)
+    raise ValueError(f"Unknown extractor backend: {name}")
+
+# ===== YOUTUBE SUBTITLE EXTRACTOR =====
+class YouTubeSubtitleExtractor:
+    # The backend (yt-dlp import, pip install or worker processes) is built on
+    # first use or by warm_up(), never at import time
+    def __init__(self, backend_name):
+        self.backend_name = backend_name
+        self.backend_lock = threading.Lock()
+        self.current_backend = None
+    
+    @property
+    def backend(self):
+        if self.current_backend is None:
+            with self.backend_lock:
+                if self.current_backend is None:
+                    started = time.perf_counter()
+                    backend = create_extractor_backend(self.backend_name)
+                    elapsed = time.perf_counter() - started
+                    boot_timer.record('extractor', elapsed)
+                    logger.info(f"Extractor backend: {backend.name} ready in {elapsed * 1000:.0f}ms")
+                    self.current_backend = backend
+        return self.current_backend
+    
+    def warm_up(self):
+        try:
+            self.backend
+        except Exception as e:
+            logger.error(f"Extractor warm-up error: {e}")
     
     def extract_video_id(self, url):
         patterns = [
-            r'(?:youtube\.com\/watch\?v=|youtu\.be\/|youtube\.com\/embed\/)([^&\n?#]+)',
+            r'(?:youtube\.com\/watch\?v=|youtu\.be\/|youtube\.com\/(?:embed|shorts|live)\/)([^&\n?#]+)',
             r'youtube\.com\/watch\?.*v=([^&\n?#]+)'
         ]
         
@@ -229,236 +1736,461 @@ class YouTubeSubtitleExtractor:
         
         return None
     
-    def get_video_info(self, video_url):
-        if not self.ytdlp_available:
+    def extract_playlist_id(self, url):
+        query = parse_qs(urlparse(url).query)
+        playlist_id = query.get('list', [None])[0]
+        return playlist_id if playlist_id and re.fullmatch(r'[\w-]+', playlist_id) else None
+    
+    def get_playlist_entries(self, playlist_url):
+        playlist_id = self.extract_playlist_id(playlist_url)
+        if not playlist_id:
+            return None, "Invalid YouTube playlist URL"
+        
+        return extraction_flight.do(('playlist', playlist_id), self.fetch_playlist_entries, playlist_id)
+    
+    def fetch_playlist_entries(self, playlist_id):
+        if not self.backend.available:
             return None, "yt-dlp not available"
         
         try:
-            import yt_dlp
+            with metrics.timer('extraction'):
+                info = self.backend.extract_playlist(f"https://www.youtube.com/playlist?list={playlist_id}",
+                                                     BATCH_MAX_ITEMS)
             
-            ydl_opts = {
-                'quiet': True,
-                'no_warnings': True,
-                'writesubtitles': True,
-                'writeautomaticsub': True,
-                'skip_download': True,
-            }
+            entries = []
+            for entry in info.get('entries') or []:
+                if entry and entry.get('id'):
+                    entries.append(f"https://www.youtube.com/watch?v={entry['id']}")
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(video_url, download=False)
-                
-                video_info = {
-                    'id': info.get('id'),
-                    'title': info.get('title'),
-                    'duration': info.get('duration'),
-                    'uploader': info.get('uploader'),
-                    'view_count': info.get('view_count'),
-                    'thumbnail': info.get('thumbnail'),
-                }
-                
-                # Get available subtitles
-                subtitles = info.get('subtitles', {})
-                auto_subtitles = info.get('automatic_captions', {})
-                
-                available_subs = {}
-                
-                # Manual subtitles
-                for lang, subs in subtitles.items():
-                    available_subs[lang] = {
-                        'type': 'manual',
-                        'language': lang,
-                        'formats': [sub.get('ext', 'vtt') for sub in subs]
-                    }
-                
-                # Automatic subtitles
-                for lang, subs in auto_subtitles.items():
-                    if lang not in available_subs:
-                        available_subs[lang] = {
-                            'type': 'auto',
-                            'language': lang,
-                            'formats': [sub.get('ext', 'vtt') for sub in subs]
-                        }
-                
-                video_info['subtitles'] = available_subs
-                
-                return video_info, None
+            return entries, None
                 
         except Exception as e:
-            return None, str(e)
+            return None, str(e) or type(e).__name__
     
-    def download_subtitle(self, video_url, language='vi', format='srt'):
-        if not self.ytdlp_available:
+    def build_video_info(self, info):
+        video_info = {
+            'id': info.get('id'),
+            'title': info.get('title'),
+            'duration': info.get('duration'),
+            'uploader': info.get('uploader'),
+            'view_count': info.get('view_count'),
+            'thumbnail': info.get('thumbnail'),
+        }
+        
+        # Get available subtitles
+        subtitles = info.get('subtitles') or {}
+        auto_subtitles = info.get('automatic_captions') or {}
+        
+        available_subs = {}
+        
+        # Manual subtitles
+        for lang, subs in subtitles.items():
+            available_subs[lang] = {
+                'type': 'manual',
+                'language': lang,
+                'formats': [sub.get('ext', 'vtt') for sub in subs]
+            }
+        
+        # Automatic subtitles
+        for lang, subs in auto_subtitles.items():
+            if lang not in available_subs:
+                available_subs[lang] = {
+                    'type': 'auto',
+                    'language': lang,
+                    'formats': [sub.get('ext', 'vtt') for sub in subs]
+                }
+        
+        video_info['subtitles'] = available_subs
+        
+        return video_info
+    
+    def get_video_info(self, video_url):
+        video_id = self.extract_video_id(video_url)
+        if video_id:
+            cached_info = video_info_cache.get(video_id)
+            if cached_info:
+                return cached_info, None
+        
+        return extraction_flight.do(('info', video_id or video_url), self.fetch_video_info, video_url, video_id)
+    
+    def fetch_video_info(self, video_url, video_id):
+        if not self.backend.available:
             return None, "yt-dlp not available"
         
         try:
-            import yt_dlp
-            
-            video_id = self.extract_video_id(video_url)
-            if not video_id:
-                return None, "Invalid YouTube URL"
-            
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"{video_id}_{language}_{format}_{timestamp}"
-            output_path = os.path.join(SUBTITLE_CACHE_DIR, filename)
-            
-            ydl_opts = {
-                'quiet': True,
-                'no_warnings': True,
-                'writesubtitles': True,
-                'writeautomaticsub': True,
-                'skip_download': True,
-                'subtitleslangs': [language],
-                'subtitlesformat': 'vtt',
-                'outtmpl': output_path,
-            }
+            with metrics.timer('extraction'):
+                info = self.backend.extract_info(video_url)
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([video_url])
-            
-            # Find the downloaded VTT file
-            vtt_file = f"{output_path}.{language}.vtt"
-            if not os.path.exists(vtt_file):
-                vtt_file = f"{output_path}.{language}.{language}.vtt"
-            
-            if not os.path.exists(vtt_file):
-                return None, f"Subtitle not found for language: {language}"
+            video_info = self.build_video_info(info)
+            video_info_cache.set(video_id or video_info['id'], video_info)
+            subtitle_track_cache.set(video_id or video_info['id'], {
+                'manual': info.get('subtitles') or {},
+                'auto': info.get('automatic_captions') or {}
+            })
             
-            # Convert VTT to requested format
-            if format == 'srt':
-                srt_content = self.convert_vtt_to_srt(vtt_file)
-                srt_file = f"{output_path}.srt"
-                with open(srt_file, 'w', encoding='utf-8') as f:
-                    f.write(srt_content)
-                
-                if os.path.exists(vtt_file):
-                    os.remove(vtt_file)
-                
-                return srt_file, None
-                
-            elif format == 'txt':
-                txt_content = self.convert_vtt_to_txt(vtt_file)
-                txt_file = f"{output_path}.txt"
-                with open(txt_file, 'w', encoding='utf-8') as f:
-                    f.write(txt_content)
-                
-                if os.path.exists(vtt_file):
-                    os.remove(vtt_file)
-                
-                return txt_file, None
+            return video_info, None
                 
         except Exception as e:
-            return None, str(e)
+            return None, str(e) or type(e).__name__
     
-    def convert_vtt_to_srt(self, vtt_file):
+    def download_subtitle(self, video_url, language='vi', format='srt'):
+        video_id = self.extract_video_id(video_url)
+        if not video_id:
+            return None, "Invalid YouTube URL"
+        
+        cached_file = subtitle_cache.get(video_id, language, format)
+        if cached_file:
+            return cached_file, None
+        
+        return extraction_flight.do(('subtitle', video_id, language, format),
+                                    self.fetch_subtitle, video_url, video_id, language, format)
+    
+    def get_subtitle_tracks(self, video_url, video_id, refresh=False):
+        tracks = None if refresh else subtitle_track_cache.get(video_id)
+        if tracks is None:
+            _, error = extraction_flight.do(('info', video_id), self.fetch_video_info, video_url, video_id)
+            if error:
+                return None, error
+            tracks = subtitle_track_cache.get(video_id)
+        
+        return tracks, None
+    
+    def select_track(self, tracks, language):
+        # Manual subtitles win over auto captions, same as yt-dlp does
+        for kind in SubtitleCache.KINDS:
+            for track in tracks[kind].get(language, []):
+                if track.get('ext') == 'vtt' and track.get('url'):
+                    return kind, track
+        
+        return None, None
+    
+    def fetch_track(self, track, stream=False):
+        with metrics.timer('track_fetch'):
+            return self.backend.fetch_track(track, stream=stream)
+    
+    def open_track(self, video_url, video_id, language, stream=False):
+        for attempt in range(2):
+            # A second attempt re-extracts in case the cached track URL expired
+            tracks, error = self.get_subtitle_tracks(video_url, video_id, refresh=attempt > 0)
+            if error:
+                return None, None, error
+            
+            kind, track = self.select_track(tracks, language)
+            if not track:
+                return None, None, f"Subtitle not found for language: {language}"
+            
+            try:
+                return kind, self.fetch_track(track, stream=stream), None
+            except requests.HTTPError:
+                if attempt:
+                    raise
+    
+    def load_cues(self, video_url, video_id, language):
+        kind, cues_file = subtitle_cache.lookup(video_id, language, CUES_FORMAT)
+        if cues_file:
+            with open_cached_text(cues_file) as f:
+                return kind, json.load(f), None
+        
+        return extraction_flight.do(('cues', video_id, language),
+                                    self.fetch_cues, video_url, video_id, language)
+    
+    def fetch_cues(self, video_url, video_id, language):
+        kind, vtt_content, error = self.open_track(video_url, video_id, language)
+        if error:
+            return None, None, error
+        
+        # Parse once; every output format renders from the stored cue model
+        with metrics.timer('conversion'):
+            cues = list(iter_vtt_cues(io.StringIO(vtt_content)))
+        subtitle_cache.put(video_id, language, kind, CUES_FORMAT, serialize_cues(cues))
+        return kind, cues, None
+    
+    def stream_subtitle(self, video_url, video_id, language, format):
         try:
-            with open(vtt_file, 'r', encoding='utf-8') as f:
-                vtt_content = f.read()
+            cues = response = None
+            kind, cues_file = subtitle_cache.lookup(video_id, language, CUES_FORMAT)
+            if cues_file:
+                try:
+                    with open_cached_text(cues_file) as f:
+                        cues = json.load(f)
+                except FileNotFoundError:
+                    # Evicted since the lookup: stream from the source instead
+                    cues = None
             
-            lines = vtt_content.split('\n')
-            srt_entries = []
+            if cues is None:
+                kind, response, error = self.open_track(video_url, video_id, language, stream=True)
+                if error:
+                    return None, error
+        except Exception as e:
+            return None, str(e) or type(e).__name__
+        
+        def collect(cues, collected):
+            for cue in cues:
+                collected.append(cue)
+                yield cue
+        
+        def generate():
+            collected = []
             
-            i = 0
-            while i < len(lines):
-                line = lines[i].strip()
-                
-                if not line or line.startswith('WEBVTT') or line.startswith('Kind:') or line.startswith('Language:') or line.startswith('NOTE'):
-                    i += 1
-                    continue
-                
-                if '-->' in line and ':' in line:
-                    timestamp_line = re.sub(r' align:\w+| position:\d+%| size:\d+%| line:[^\s]+', '', line).strip()
-                    timestamp_line = timestamp_line.replace('.', ',')
-                    
-                    text_lines = []
-                    i += 1
-                    
-                    while i < len(lines):
-                        text_line = lines[i].strip()
-                        
-                        if not text_line or ('-->' in text_line and ':' in text_line):
-                            break
-                        
-                        clean_text = re.sub(r'<[^>]+>', '', text_line).strip()
-                        if clean_text:
-                            text_lines.append(clean_text)
-                        
-                        i += 1
-                    
-                    if text_lines and '-->' in timestamp_line:
-                        full_text = ' '.join(text_lines)
-                        
-                        duplicate = False
-                        for existing_entry in srt_entries:
-                            if existing_entry['text'] == full_text:
-                                duplicate = True
-                                break
-                        
-                        if not duplicate:
-                            srt_entries.append({
-                                'timestamp': timestamp_line,
-                                'text': full_text
-                            })
-                    
-                    continue
+            # Tee each chunk into the cache so the next request is a plain file hit
+            with subtitle_cache.writer(video_id, language, kind, format) as f:
+                if response is None:
+                    stream_cues = cues
                 else:
-                    i += 1
-            
-            srt_lines = []
-            for index, entry in enumerate(srt_entries, 1):
-                srt_lines.append(str(index))
-                srt_lines.append(entry['timestamp'])
-                srt_lines.append(entry['text'])
-                srt_lines.append('')
+                    stream_cues = collect(iter_vtt_cues(response.iter_lines(decode_unicode=True)), collected)
+                
+                try:
+                    for chunk in iter_chunks(SUBTITLE_RENDERERS[format](stream_cues)):
+                        f.write(chunk)
+                        yield chunk
+                finally:
+                    if response is not None:
+                        response.close()
             
-            return '\n'.join(srt_lines)
+            if response is not None:
+                subtitle_cache.put(video_id, language, kind, CUES_FORMAT, serialize_cues(collected))
+        
+        return generate(), None
+    
+    def fetch_subtitle(self, video_url, video_id, language, format):
+        if format not in SUBTITLE_RENDERERS:
+            return None, f"Unsupported format: {format}"
+        
+        try:
+            kind, cues, error = self.load_cues(video_url, video_id, language)
+            if error:
+                return None, error
             
+            # Render in memory, only the result touches disk
+            with metrics.timer('conversion'):
+                content = ''.join(SUBTITLE_RENDERERS[format](cues))
+            return subtitle_cache.put(video_id, language, kind, format, content), None
+                
+        except Exception as e:
+            return None, str(e) or type(e).__name__
+    
+    def convert_vtt_to_srt(self, vtt_content):
+        try:
+            return ''.join(render_srt(iter_vtt_cues(io.StringIO(vtt_content))))
         except Exception as e:
             logger.error(f"VTT to SRT conversion error: {e}")
             return ""
 
-    def convert_vtt_to_txt(self, vtt_file):
+    def convert_vtt_to_txt(self, vtt_content):
         try:
-            with open(vtt_file, 'r', encoding='utf-8') as f:
-                vtt_content = f.read()
-            
-            lines = vtt_content.split('\n')
-            sentences = []
-            seen_sentences = set()
-            
-            for line in lines:
-                line = line.strip()
-                
-                if (not line or 
-                    line.startswith('WEBVTT') or 
-                    line.startswith('Kind:') or 
-                    line.startswith('Language:') or 
-                    line.startswith('NOTE') or
-                    '-->' in line or
-                    ':' in line and len(line.split(':')) >= 3):
-                    continue
-                
-                clean_line = re.sub(r'<[^>]+>', '', line).strip()
-                
-                if clean_line and clean_line not in seen_sentences:
-                    seen_sentences.add(clean_line)
-                    sentences.append(clean_line)
+            return ''.join(render_txt(iter_vtt_cues(io.StringIO(vtt_content))))
+        except Exception as e:
+            logger.error(f"VTT to TXT conversion error: {e}")
+            return ""
+
+subtitle_extractor = YouTubeSubtitleExtractor(EXTRACTOR_BACKEND)
+
+# ===== SUBTITLE JOBS =====
+# Bounded worker pool so long downloads don't hold request threads. Job state
+# lives in this process only: behind several server workers a poll can land on
+# one that never saw the job and gets a 404, so the homepage falls back to
+# /download_subtitle and API clients should retry the same way.
+class JobQueue:
+    def __init__(self, workers, max_queued, result_ttl, name='job'):
+        self.name = name
+        self.queue = queue.Queue(maxsize=max_queued)
+        self.result_ttl = result_ttl
+        self.lock = threading.Lock()
+        self.finished = threading.Condition(self.lock)
+        self.jobs = {}
+        self.worker_count = workers
+        self.workers = []
+    
+    def start(self):
+        for i in range(self.worker_count):
+            worker = threading.Thread(target=self.worker_loop, name=f"{self.name}-worker-{i}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+    
+    def submit(self, fn, **kwargs):
+        self.prune()
+        
+        job = {
+            'id': uuid.uuid4().hex,
+            'status': 'queued',
+            'created_at': time.time(),
+            'finished_at': None,
+            'result': None
+        }
+        
+        with self.lock:
+            self.jobs[job['id']] = job
+        
+        try:
+            self.queue.put_nowait((job['id'], fn, kwargs))
+        except queue.Full:
+            with self.lock:
+                del self.jobs[job['id']]
+            raise
+        
+        return dict(job)
+    
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+    
+    def worker_loop(self):
+        while True:
+            job_id, fn, kwargs = self.queue.get()
+            self.update(job_id, status='running')
             
-            full_text = ' '.join(sentences)
-            sentence_endings = re.split(r'[.!?]+\s+', full_text)
-            final_sentences = []
+            try:
+                result = fn(**kwargs)
+                status = 'done' if result.get('success') else 'error'
+            except Exception as e:
+                logger.error(f"Job {job_id} error: {e}")
+                result = {'success': False, 'message': f'Lỗi server: {str(e)}'}
+                status = 'error'
             
-            for sentence in sentence_endings:
-                sentence = sentence.strip()
-                if sentence and sentence not in final_sentences:
-                    final_sentences.append(sentence)
+            self.update(job_id, status=status, result=result, finished_at=time.time())
+            self.queue.task_done()
+    
+    def update(self, job_id, **fields):
+        with self.lock:
+            if job_id in self.jobs:
+                self.jobs[job_id].update(fields)
+            if fields.get('finished_at'):
+                self.finished.notify_all()
+    
+    def wait_finished(self, job_ids, timeout=None):
+        # Block until at least one of job_ids has finished; returns the finished
+        # ones, with None for jobs that were already pruned
+        def collect():
+            return {job_id: dict(self.jobs[job_id]) if job_id in self.jobs else None
+                    for job_id in job_ids
+                    if job_id not in self.jobs or self.jobs[job_id]['finished_at']}
+        
+        with self.finished:
+            self.finished.wait_for(collect, timeout)
+            return collect()
+    
+    def prune(self):
+        cutoff = time.time() - self.result_ttl
+        with self.lock:
+            expired = [job_id for job_id, job in self.jobs.items()
+                       if job['finished_at'] and job['finished_at'] < cutoff]
+            for job_id in expired:
+                del self.jobs[job_id]
+    
+    def get_stats(self):
+        with self.lock:
+            statuses = [job['status'] for job in self.jobs.values()]
+        return {
+            'workers': len(self.workers),
+            'queued': self.queue.qsize(),
+            'max_queued': self.queue.maxsize,
+            'running': statuses.count('running')
+        }
+
+subtitle_jobs = JobQueue(JOB_WORKERS, JOB_QUEUE_SIZE, JOB_RESULT_TTL)
+# Batches get their own pool so a long playlist can't starve single downloads
+batch_jobs = JobQueue(BATCH_WORKERS, BATCH_QUEUE_SIZE, JOB_RESULT_TTL, name='batch')
+
+# ===== SUBTITLE BATCHES =====
+# A batch fans its items out to batch_jobs and remembers which job serves which
+# item. Like jobs, batches are per process: run a single worker process (or
+# sticky sessions) when using /batch behind several workers.
+class BatchRegistry:
+    def __init__(self, job_queue, result_ttl):
+        self.job_queue = job_queue
+        self.result_ttl = result_ttl
+        self.lock = threading.Lock()
+        self.batches = {}
+    
+    def create(self, urls, language, format):
+        self.prune()
+        
+        items = []
+        for index, url in enumerate(urls, 1):
+            item = {'index': index, 'url': url, 'video_id': None, 'job_id': None, 'message': None}
+            video_id = subtitle_extractor.extract_video_id(url)
             
-            return '\n'.join(final_sentences)
+            if not video_id:
+                item['message'] = 'URL YouTube không hợp lệ'
+            else:
+                item['video_id'] = video_id
+                try:
+                    job = self.job_queue.submit(process_download, video_url=url, video_id=video_id,
+                                                language=language, format=format)
+                    item['job_id'] = job['id']
+                except queue.Full:
+                    item['message'] = 'Máy chủ đang bận, vui lòng thử lại sau'
             
-        except Exception as e:
-            logger.error(f"VTT to TXT conversion error: {e}")
-            return ""
+            items.append(item)
+        
+        batch = {
+            'id': uuid.uuid4().hex,
+            'created_at': time.time(),
+            'language': language,
+            'format': format,
+            'items': items
+        }
+        
+        with self.lock:
+            self.batches[batch['id']] = batch
+        
+        return batch
+    
+    def get(self, batch_id):
+        with self.lock:
+            return self.batches.get(batch_id)
+    
+    def item_status(self, item, job):
+        status = {key: item[key] for key in ('index', 'url', 'video_id')}
+        
+        if not item['job_id']:
+            status.update(status='error', message=item['message'])
+        elif not job:
+            status.update(status='error', message='Job expired')
+        else:
+            status['status'] = job['status']
+            if job['result']:
+                status['message'] = job['result'].get('message')
+                status['download_url'] = job['result'].get('download_url')
+        
+        return status
+    
+    def get_progress(self, batch):
+        items = [self.item_status(item, self.job_queue.get(item['job_id']) if item['job_id'] else None)
+                 for item in batch['items']]
+        finished = [item for item in items if item['status'] in ('done', 'error')]
+        
+        return {
+            'id': batch['id'],
+            'total': len(items),
+            'finished': len(finished),
+            'failed': sum(1 for item in finished if item['status'] == 'error'),
+            'items': items
+        }
+    
+    def iter_finished(self, batch):
+        # Yield item statuses in completion order, failed submissions first
+        pending = {}
+        for item in batch['items']:
+            if item['job_id']:
+                pending[item['job_id']] = item
+            else:
+                yield self.item_status(item, None)
+        
+        while pending:
+            finished = self.job_queue.wait_finished(list(pending), timeout=HTTP_TIMEOUT)
+            for job_id, job in finished.items():
+                yield self.item_status(pending.pop(job_id), job)
+    
+    def prune(self):
+        cutoff = time.time() - self.result_ttl
+        with self.lock:
+            expired = [batch_id for batch_id, batch in self.batches.items() if batch['created_at'] < cutoff]
+            for batch_id in expired:
+                del self.batches[batch_id]
 
-subtitle_extractor = YouTubeSubtitleExtractor()
+subtitle_batches = BatchRegistry(batch_jobs, JOB_RESULT_TTL)
 
 # ===== ADMIN AUTHENTICATION =====
 def admin_required(f):
@@ -470,34 +2202,141 @@ def admin_required(f):
     return decorated_function
 
 # ===== UTILITY FUNCTIONS =====
-def get_banners(position=None):
-    try:
-        conn = sqlite3.connect('subtitle_app.db')
+def bump_cache_version(cursor, name):
+    cursor.execute('''
+        INSERT INTO cache_versions (name, version) VALUES (?, 1)
+        ON CONFLICT(name) DO UPDATE SET version = version + 1
+    ''', (name,))
+
+# Active banners grouped by position plus a link map for every banner, reloaded
+# with a single query when the shared version changes; the version itself is
+# only checked every ttl seconds
+class BannerCache:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.version = None
+        self.banners = None
+        self.links = {}
+        self.checked_at = 0
+    
+    def get(self, position=None):
+        with self.lock:
+            if self.banners is None or time.time() - self.checked_at > self.ttl:
+                self.refresh()
+            
+            if position:
+                return list(self.banners.get(position, []))
+            return [banner for banners in self.banners.values() for banner in banners]
+    
+    def get_link(self, banner_id):
+        with self.lock:
+            stale = time.time() - self.checked_at > self.ttl
+            # A miss may be a banner another process just created, but don't let
+            # bogus ids turn into a query per click
+            if self.banners is None or stale or (banner_id not in self.links and time.time() - self.checked_at > 1):
+                self.refresh()
+            
+            return banner_id in self.links, self.links.get(banner_id)
+    
+    def refresh(self):
+        conn = get_db()
         cursor = conn.cursor()
         
-        if position:
-            cursor.execute('SELECT * FROM banners WHERE position = ? AND status = 1 ORDER BY id DESC', (position,))
-        else:
-            cursor.execute('SELECT * FROM banners WHERE status = 1 ORDER BY id DESC')
-        
-        banners = cursor.fetchall()
-        conn.close()
+        cursor.execute("SELECT version FROM cache_versions WHERE name = 'banners'")
+        row = cursor.fetchone()
+        version = row[0] if row else 0
         
-        banner_list = []
-        for banner in banners:
-            banner_list.append({
-                'id': banner[0],
-                'title': banner[1],
-                'description': banner[2],
-                'image_path': banner[3],
-                'link_url': banner[4],
-                'position': banner[5],
-                'clicks': banner[6],
-                'status': banner[7],
-                'created_at': banner[8]
-            })
+        if self.banners is None or version != self.version:
+            cursor.execute('SELECT * FROM banners ORDER BY id DESC')
+            
+            banners = {}
+            links = {}
+            for banner in cursor.fetchall():
+                links[banner[0]] = banner[4]
+                if not banner[7]:
+                    continue
+                
+                banners.setdefault(banner[5], []).append({
+                    'id': banner[0],
+                    'title': banner[1],
+                    'description': banner[2],
+                    'image_path': banner[3],
+                    'link_url': banner[4],
+                    'position': banner[5],
+                    'clicks': banner[6],
+                    'status': banner[7],
+                    'created_at': banner[8]
+                })
+            
+            self.banners = banners
+            self.links = links
+            self.version = version
         
-        return banner_list
+        conn.close()
+        self.checked_at = time.time()
+    
+    def invalidate(self):
+        with self.lock:
+            self.banners = None
+
+banner_cache = BannerCache(BANNER_CACHE_TTL)
+
+# Click increments are counted in memory and written in one transaction per interval
+class BannerClickCounter:
+    def __init__(self, flush_interval):
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.pending = {}
+    
+    def start(self):
+        self.flush_thread = threading.Thread(target=self.flush_loop, daemon=True)
+        self.flush_thread.start()
+        atexit.register(self.flush)
+    
+    def increment(self, banner_id):
+        with self.lock:
+            self.pending[banner_id] = self.pending.get(banner_id, 0) + 1
+    
+    def get_pending(self, banner_id):
+        with self.lock:
+            return self.pending.get(banner_id, 0)
+    
+    def flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+    
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                pending = self.pending
+                self.pending = {}
+            
+            if not pending:
+                return
+            
+            try:
+                with metrics.timer('db_write'):
+                    conn = get_db()
+                    with conn:
+                        conn.executemany('UPDATE banners SET clicks = clicks + ? WHERE id = ?',
+                                         [(count, banner_id) for banner_id, count in pending.items()])
+                    conn.close()
+                
+            except Exception as e:
+                logger.error(f"Banner click flush error: {e}")
+                # Put the counts back so the next flush retries them
+                with self.lock:
+                    for banner_id, count in pending.items():
+                        self.pending[banner_id] = self.pending.get(banner_id, 0) + count
+
+banner_clicks = BannerClickCounter(BANNER_CLICK_FLUSH_INTERVAL)
+
+def get_banners(position=None):
+    try:
+        return banner_cache.get(position)
         
     except Exception as e:
         logger.error(f"Error getting banners: {e}")
@@ -505,18 +2344,17 @@ def get_banners(position=None):
 
 def get_cache_info():
     try:
-        total_files = 0
-        total_size = 0
-        
-        for filename in os.listdir(SUBTITLE_CACHE_DIR):
-            file_path = os.path.join(SUBTITLE_CACHE_DIR, filename)
-            if os.path.isfile(file_path):
-                total_files += 1
-                total_size += os.path.getsize(file_path)
+        stats = subtitle_cache.get_stats()
         
         return {
-            'total_files': total_files,
-            'total_size_mb': round(total_size / (1024 * 1024), 2)
+            'total_files': stats['total_files'],
+            'total_size_mb': round(stats['total_size'] / (1024 * 1024), 2),
+            'max_files': stats['max_files'],
+            'max_size_mb': round(stats['max_bytes'] / (1024 * 1024), 2),
+            'usage_percent': round(100 * max(stats['total_size'] / max(stats['max_bytes'], 1),
+                                             stats['total_files'] / max(stats['max_files'], 1)), 1),
+            'evictions': stats['evictions'],
+            'evictions_last_hour': stats['evictions_last_hour']
         }
         
     except Exception as e:
@@ -525,21 +2363,7 @@ def get_cache_info():
 
 def cleanup_cache(max_age_hours=24):
     try:
-        current_time = time.time()
-        deleted_count = 0
-        
-        for filename in os.listdir(SUBTITLE_CACHE_DIR):
-            file_path = os.path.join(SUBTITLE_CACHE_DIR, filename)
-            if os.path.isfile(file_path):
-                file_age = current_time - os.path.getctime(file_path)
-                if file_age > (max_age_hours * 3600):
-                    try:
-                        os.remove(file_path)
-                        deleted_count += 1
-                    except:
-                        pass
-        
-        return deleted_count
+        return subtitle_cache.evict_older_than(time.time() - max_age_hours * 3600)
         
     except Exception as e:
         logger.error(f"Cache cleanup error: {e}")
@@ -547,15 +2371,15 @@ def cleanup_cache(max_age_hours=24):
 
 def clear_all_cache():
     try:
-        deleted_count = 0
+        deleted_count = subtitle_cache.clear()
         
-        for filename in os.listdir(SUBTITLE_CACHE_DIR):
-            file_path = os.path.join(SUBTITLE_CACHE_DIR, filename)
-            if os.path.isfile(file_path):
+        # A full clear is rare, so also sweep files the ledger never saw (crashed writes)
+        for entry in os.scandir(SUBTITLE_CACHE_DIR):
+            if entry.is_file():
                 try:
-                    os.remove(file_path)
+                    os.remove(entry.path)
                     deleted_count += 1
-                except:
+                except OSError:
                     pass
         
         return deleted_count
@@ -564,12 +2388,173 @@ def clear_all_cache():
         logger.error(f"Cache clear error: {e}")
         return 0
 
+# Values the components already track, read at scrape time
+def collect_component_metrics():
+    for cache_name, cache in (('video_info', video_info_cache), ('subtitle_tracks', subtitle_track_cache)):
+        stats = cache.get_stats()
+        yield 'cache_requests_total', {'cache': cache_name, 'result': 'hit'}, stats['hits']
+        yield 'cache_requests_total', {'cache': cache_name, 'result': 'miss'}, stats['misses']
+    
+    # current_backend, not backend: a scrape must not trigger the extractor setup
+    if isinstance(subtitle_extractor.current_backend, ProcessPoolYtDlpBackend):
+        pool = subtitle_extractor.current_backend.get_stats()
+        yield 'extractor_pool_idle_workers', {}, pool['idle']
+        yield 'extractor_pool_tasks_total', {}, pool['tasks']
+        for reason, count in pool['recycled'].items():
+            yield 'extractor_pool_recycled_total', {'reason': reason}, count
+    
+    flight = extraction_flight.get_stats()
+    yield 'extractions_in_flight', {}, flight['in_flight']
+    yield 'extractions_coalesced_total', {}, flight['coalesced']
+    
+    for jobs in (subtitle_jobs, batch_jobs):
+        stats = jobs.get_stats()
+        yield 'jobs_queued', {'queue': jobs.name}, stats['queued']
+        yield 'jobs_running', {'queue': jobs.name}, stats['running']
+    
+    cache = subtitle_cache.get_stats()
+    yield 'subtitle_cache_bytes', {}, cache['total_size']
+    yield 'subtitle_cache_files', {}, cache['total_files']
+    for reason, count in cache['evictions'].items():
+        yield 'subtitle_cache_evictions_total', {'reason': reason}, count
+    
+    for phase, seconds in boot_timer.get_stats().items():
+        yield 'boot_phase_seconds', {'phase': phase}, round(seconds, 6)
+
+metrics.register_collector(collect_component_metrics)
+
+# Write-only file object for zipfile; drain() hands back what was written so
+# a ZIP can be streamed entry by entry without buffering the whole archive
+class ZipStream:
+    def __init__(self):
+        self.chunks = []
+    
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+# Content-Disposition for hand-built responses, quoted the way send_file does
+# it (video ids can contain spaces or ';'), with an RFC 5987 name for non-ASCII
+def attachment_header(download_name):
+    try:
+        download_name.encode('ascii')
+        names = {'filename': download_name}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', download_name).encode('ascii', 'ignore').decode('ascii')
+        names = {'filename': simple, 'filename*': f"UTF-8''{quote(download_name, safe='!#$&+-.^_`|~')}"}
+    return dump_options_header('attachment', names)
+
+def write_cached_file(archive, file_path, arcname):
+    with open_cached_text(file_path) as src, archive.open(arcname, 'w') as dst:
+        shutil.copyfileobj(src.buffer, dst)
+
+# Cache artifacts are gzip on disk: pass the bytes through with Content-Encoding
+# when the client accepts gzip, otherwise inflate them while streaming
+#
+# Both paths carry a strong ETag from the content hash plus Last-Modified, and
+# answer conditional and Range requests against the representation they send
+def send_cached_file(file_path, download_name, format):
+    mimetype = SUBTITLE_MIMETYPES.get(format) or mimetypes.guess_type(download_name)[0]
+    etag = subtitle_cache.get_etag(os.path.basename(file_path))
+    
+    if request.accept_encodings['gzip']:
+        # Flask resolves relative paths against the app root, not the working directory
+        response = send_file(os.path.abspath(file_path), as_attachment=True, download_name=download_name,
+                             mimetype=mimetype, etag=etag, max_age=DOWNLOAD_CACHE_MAX_AGE)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        def generate():
+            with gzip.open(file_path, 'rb') as f:
+                while True:
+                    chunk = f.read(STREAM_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+        
+        content_length = get_uncompressed_size(file_path)
+        response = Response(generate(), mimetype=mimetype, headers={
+            'Content-Disposition': attachment_header(download_name),
+            'Content-Length': str(content_length)
+        })
+        # The inflated bytes are a different representation, so they get their own tag
+        response.set_etag(f"{etag}-identity")
+        response.last_modified = os.path.getmtime(file_path)
+        response.cache_control.public = True
+        response.cache_control.max_age = DOWNLOAD_CACHE_MAX_AGE
+        response.make_conditional(request, accept_ranges=True, complete_length=content_length)
+    
+    response.vary.add('Accept-Encoding')
+    
+    # Wrapping the body (rather than call_on_close, which direct passthrough
+    # skips) means the timer stops only once the transfer is done
+    send_started = time.perf_counter()
+    response.response = ClosingIterator(response.response, lambda: metrics.observe(
+        'stage_duration_seconds', time.perf_counter() - send_started, stage='file_send'))
+    return response
+
 # ===== MIDDLEWARE =====
+# Servers that only import `server:app` get the same startup on their first request
+@app.before_request
+def ensure_started():
+    create_app()
+
+# Publicly cacheable file downloads never touch the session, so they carry no
+# Set-Cookie or Vary: Cookie a shared cache could store and replay. Metrics
+# scrapes send no cookies and would mint a new visitor every time, and job and
+# batch status polls would count as page views.
+UNTRACKED_ENDPOINTS = {'download_file', 'metrics_endpoint', 'get_job', 'get_batch'}
+
+def is_tracked_request():
+    return bool(request.endpoint) and not request.endpoint.startswith('static') and \
+        request.endpoint not in UNTRACKED_ENDPOINTS
+
 @app.before_request
 def track_visitors():
-    if request.endpoint and not request.endpoint.startswith('static'):
+    if is_tracked_request():
         visitor_tracker.track_visitor(request)
 
+# Tracked requests always use the session and may get a cookie when Flask
+# saves it after this hook, so their responses must not be cached publicly.
+# (Reading session.accessed here would itself mark the session as used.)
+@app.after_request
+def keep_session_responses_private(response):
+    if response.cache_control.public and is_tracked_request():
+        response.cache_control.public = False
+        response.cache_control.private = True
+    return response
+
+@app.after_request
+def record_request_metrics(response):
+    # The endpoint is only known inside Flask; RequestTimer reads it back from environ
+    request.environ['dowsub.endpoint'] = request.endpoint or 'unmatched'
+    metrics.inc('requests_total', endpoint=request.environ['dowsub.endpoint'], status=response.status_code)
+    return response
+
+# WSGI wrapper so streamed and file responses are timed until the server has
+# sent the last byte and closed the body, not just until the view returns
+class RequestTimer:
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+    
+    def __call__(self, environ, start_response):
+        started = time.perf_counter()
+        
+        def record():
+            metrics.observe('request_duration_seconds', time.perf_counter() - started,
+                            endpoint=environ.get('dowsub.endpoint', 'unmatched'), method=environ['REQUEST_METHOD'])
+        
+        return ClosingIterator(self.wsgi_app(environ, start_response), record)
+
+app.wsgi_app = RequestTimer(app.wsgi_app)
+
 # ===== MAIN ROUTES =====
 @app.route('/')
 def index():
@@ -628,91 +2613,315 @@ def get_video_info():
         logger.error(f"Get video info error: {e}")
         return jsonify({'success': False, 'message': f'Lỗi server: {str(e)}'})
 
+def validate_download_request(data):
+    if not data:
+        return None, 'Invalid JSON data'
+    
+    video_url = data.get('url', '').strip()
+    language = data.get('language', 'vi')
+    format = data.get('format', 'srt')
+    
+    if not video_url:
+        return None, 'URL không được để trống'
+    
+    if format not in SUBTITLE_RENDERERS:
+        return None, 'Format không hỗ trợ (chỉ hỗ trợ SRT, TXT, VTT, JSON và ASS)'
+    
+    video_id = subtitle_extractor.extract_video_id(video_url)
+    if not video_id:
+        return None, 'URL YouTube không hợp lệ'
+    
+    return {
+        'video_url': video_url,
+        'video_id': video_id,
+        'language': language,
+        'format': format
+    }, None
+
+def track_download(video_id, video_url, language, format, subtitle_file):
+    try:
+        # Title comes from the metadata cache, never from a fresh extraction
+        video_info = video_info_cache.get(video_id)
+        
+        with metrics.timer('db_write'):
+            conn = get_db()
+            cursor = conn.cursor()
+        
+            cursor.execute('''
+                INSERT INTO subtitle_downloads 
+                (video_id, video_title, video_url, language, format, file_size)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(video_id, language, format) DO UPDATE SET
+                    download_count = download_count + 1,
+                    last_downloaded = CURRENT_TIMESTAMP
+            ''', (
+                video_id,
+                video_info.get('title', '') if video_info else '',
+                video_url,
+                language,
+                format,
+                get_uncompressed_size(subtitle_file)
+            ))
+        
+            conn.commit()
+            conn.close()
+        
+    except Exception as e:
+        logger.error(f"Database tracking error: {e}")
+
+def process_download(video_url, video_id, language, format):
+    subtitle_file, error = subtitle_extractor.download_subtitle(video_url, language, format)
+    
+    if error:
+        return {'success': False, 'message': f'Lỗi: {error}'}
+    
+    if not subtitle_file or not os.path.exists(subtitle_file):
+        return {'success': False, 'message': 'Không thể tải phụ đề'}
+    
+    track_download(video_id, video_url, language, format, subtitle_file)
+    
+    return {
+        'success': True,
+        'message': f'Tải phụ đề {format.upper()} thành công',
+        'download_url': f'/download_file/{os.path.basename(subtitle_file)}',
+        'filename': f"{video_id}_{language}.{format}",
+        'language': language,
+        'format': format,
+        'file_size': get_uncompressed_size(subtitle_file)
+    }
+
+def stream_download(video_url, video_id, language, format):
+    download_name = f"{video_id}_{language}.{format}"
+    
+    cached_file = subtitle_cache.get(video_id, language, format)
+    if cached_file:
+        track_download(video_id, video_url, language, format, cached_file)
+        return send_cached_file(cached_file, download_name, format)
+    
+    chunks, error = subtitle_extractor.stream_subtitle(video_url, video_id, language, format)
+    if error:
+        return jsonify({'success': False, 'message': f'Lỗi: {error}'})
+    
+    def generate():
+        yield from chunks
+        
+        cached_file = subtitle_cache.get(video_id, language, format)
+        if cached_file:
+            track_download(video_id, video_url, language, format, cached_file)
+    
+    return Response(generate(), mimetype=SUBTITLE_MIMETYPES[format], headers={
+        'Content-Disposition': attachment_header(download_name),
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/download_subtitle', methods=['POST'])
 def download_subtitle():
+    try:
+        data = request.get_json()
+        params, error = validate_download_request(data)
+        if error:
+            return jsonify({'success': False, 'message': error})
+        
+        # Streaming mode sends the converted subtitle as it is parsed
+        if data.get('stream'):
+            return stream_download(**params)
+        
+        return jsonify(process_download(**params))
+        
+    except Exception as e:
+        logger.error(f"Download subtitle error: {e}")
+        return jsonify({'success': False, 'message': f'Lỗi server: {str(e)}'})
+
+@app.route('/download_bundle', methods=['POST'])
+def download_bundle():
+    try:
+        data = request.get_json()
+        params, error = validate_download_request(data)
+        if error:
+            return jsonify({'success': False, 'message': error})
+        
+        video_url = params['video_url']
+        video_id = params['video_id']
+        
+        # A bare string like "vi" would otherwise be split into ['v', 'i']
+        for field in ('languages', 'formats'):
+            values = data.get(field) or []
+            if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+                return jsonify({'success': False, 'message': f'{field} phải là một danh sách'})
+        
+        languages = list(dict.fromkeys(data.get('languages') or []))
+        formats = list(dict.fromkeys(data.get('formats') or [params['format']]))
+        
+        if not languages:
+            return jsonify({'success': False, 'message': 'Vui lòng chọn ít nhất một ngôn ngữ'})
+        
+        if len(languages) > BUNDLE_MAX_LANGUAGES:
+            return jsonify({'success': False, 'message': f'Tối đa {BUNDLE_MAX_LANGUAGES} ngôn ngữ mỗi lần tải'})
+        
+        if any(format not in SUBTITLE_RENDERERS for format in formats):
+            return jsonify({'success': False, 'message': 'Format không hỗ trợ (chỉ hỗ trợ SRT, TXT, VTT, JSON và ASS)'})
+        
+        # One extraction serves every track in the bundle
+        video_info, error = subtitle_extractor.get_video_info(video_url)
+        if error:
+            return jsonify({'success': False, 'message': f'Lỗi: {error}'})
+        
+        errors = [f"{language}: not available" for language in languages
+                  if language not in video_info['subtitles']]
+        languages = [language for language in languages if language in video_info['subtitles']]
+        
+        if not languages:
+            return jsonify({'success': False, 'message': 'Video không có phụ đề cho các ngôn ngữ đã chọn'})
+        
+        def generate():
+            stream = ZipStream()
+            with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as bundle:
+                for language in languages:
+                    for format in formats:
+                        subtitle_file, error = subtitle_extractor.download_subtitle(video_url, language, format)
+                        if error:
+                            errors.append(f"{language}.{format}: {error}")
+                            continue
+                        
+                        # The janitor may evict the artifact before it is read back
+                        try:
+                            write_cached_file(bundle, subtitle_file, f"{video_id}_{language}.{format}")
+                        except OSError as e:
+                            errors.append(f"{language}.{format}: {e}")
+                            continue
+                        track_download(video_id, video_url, language, format, subtitle_file)
+                        yield stream.drain()
+                
+                if errors:
+                    bundle.writestr('errors.txt', '\n'.join(errors) + '\n')
+            
+            yield stream.drain()
+        
+        return Response(generate(), mimetype='application/zip', headers={
+            'Content-Disposition': attachment_header(f"{video_id}_subtitles.zip"),
+            'X-Accel-Buffering': 'no'
+        })
+        
+    except Exception as e:
+        logger.error(f"Download bundle error: {e}")
+        return jsonify({'success': False, 'message': f'Lỗi server: {str(e)}'})
+
+@app.route('/batch', methods=['POST'])
+def create_batch():
     try:
         data = request.get_json()
         if not data:
             return jsonify({'success': False, 'message': 'Invalid JSON data'})
         
-        video_url = data.get('url', '').strip()
         language = data.get('language', 'vi')
         format = data.get('format', 'srt')
         
-        if not video_url:
-            return jsonify({'success': False, 'message': 'URL không được để trống'})
-        
-        if format not in ['srt', 'txt']:
-            return jsonify({'success': False, 'message': 'Format không hỗ trợ (chỉ hỗ trợ SRT và TXT)'})
+        # A bare string would otherwise be iterated one character per item
+        if not isinstance(data.get('urls') or [], list):
+            return jsonify({'success': False, 'message': 'urls phải là một danh sách'})
         
-        video_id = subtitle_extractor.extract_video_id(video_url)
-        if not video_id:
-            return jsonify({'success': False, 'message': 'URL YouTube không hợp lệ'})
+        urls = [url.strip() for url in data.get('urls') or [] if isinstance(url, str) and url.strip()]
+        playlist_url = (data.get('playlist_url') or '').strip()
         
-        subtitle_file, error = subtitle_extractor.download_subtitle(video_url, language, format)
+        if format not in SUBTITLE_RENDERERS:
+            return jsonify({'success': False, 'message': 'Format không hỗ trợ (chỉ hỗ trợ SRT, TXT, VTT, JSON và ASS)'})
         
-        if error:
-            return jsonify({'success': False, 'message': f'Lỗi: {error}'})
+        if playlist_url:
+            entries, error = subtitle_extractor.get_playlist_entries(playlist_url)
+            if error:
+                return jsonify({'success': False, 'message': f'Lỗi: {error}'})
+            urls.extend(entries)
         
-        if not subtitle_file or not os.path.exists(subtitle_file):
-            return jsonify({'success': False, 'message': 'Không thể tải phụ đề'})
+        urls = list(dict.fromkeys(urls))
+        if not urls:
+            return jsonify({'success': False, 'message': 'Danh sách URL trống'})
         
-        # Track download in database
-        try:
-            video_info, _ = subtitle_extractor.get_video_info(video_url)
-            
-            conn = sqlite3.connect('subtitle_app.db')
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT id, download_count FROM subtitle_downloads 
-                WHERE video_id = ? AND language = ? AND format = ?
-            ''', (video_id, language, format))
-            
-            existing = cursor.fetchone()
-            
-            if existing:
-                cursor.execute('''
-                    UPDATE subtitle_downloads 
-                    SET download_count = download_count + 1, last_downloaded = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                ''', (existing[0],))
-            else:
-                cursor.execute('''
-                    INSERT INTO subtitle_downloads 
-                    (video_id, video_title, video_url, language, format, file_size)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (
-                    video_id,
-                    video_info.get('title', '') if video_info else '',
-                    video_url,
-                    language,
-                    format,
-                    os.path.getsize(subtitle_file)
-                ))
-            
-            conn.commit()
-            conn.close()
-            
-        except Exception as e:
-            logger.error(f"Database tracking error: {e}")
+        if len(urls) > BATCH_MAX_ITEMS:
+            return jsonify({'success': False, 'message': f'Tối đa {BATCH_MAX_ITEMS} video mỗi lần tải'})
         
-        filename = f"{video_id}_{language}.{format}"
+        batch = subtitle_batches.create(urls, language, format)
         
         return jsonify({
             'success': True,
-            'message': f'Tải phụ đề {format.upper()} thành công',
-            'download_url': f'/download_file/{os.path.basename(subtitle_file)}',
-            'filename': filename,
-            'language': language,
-            'format': format,
-            'file_size': os.path.getsize(subtitle_file)
-        })
+            'batch_id': batch['id'],
+            'download_url': f"/batch/{batch['id']}/download",
+            'progress': subtitle_batches.get_progress(batch)
+        }), 202
         
     except Exception as e:
-        logger.error(f"Download subtitle error: {e}")
+        logger.error(f"Create batch error: {e}")
+        return jsonify({'success': False, 'message': f'Lỗi server: {str(e)}'})
+
+@app.route('/batch/<batch_id>')
+def get_batch(batch_id):
+    batch = subtitle_batches.get(batch_id)
+    if not batch:
+        return jsonify({'success': False, 'message': 'Batch not found (expired or created by another server process)'}), 404
+    
+    return jsonify({'success': True, 'batch': subtitle_batches.get_progress(batch)})
+
+@app.route('/batch/<batch_id>/download')
+def download_batch(batch_id):
+    batch = subtitle_batches.get(batch_id)
+    if not batch:
+        return jsonify({'success': False, 'message': 'Batch not found (expired or created by another server process)'}), 404
+    
+    def generate():
+        errors = []
+        stream = ZipStream()
+        
+        # Entries are added as items finish, so the archive starts flowing right away
+        with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for item in subtitle_batches.iter_finished(batch):
+                if item['status'] != 'done':
+                    errors.append(f"{item['index']}. {item['url']}: {item.get('message') or 'failed'}")
+                    continue
+                
+                subtitle_file = os.path.join(SUBTITLE_CACHE_DIR, os.path.basename(item['download_url']))
+                arcname = f"{item['index']:03d}_{item['video_id']}_{batch['language']}.{batch['format']}"
+                try:
+                    write_cached_file(archive, subtitle_file, arcname)
+                except OSError as e:
+                    errors.append(f"{item['index']}. {item['url']}: {e}")
+                    continue
+                yield stream.drain()
+            
+            if errors:
+                archive.writestr('errors.txt', '\n'.join(errors) + '\n')
+        
+        yield stream.drain()
+    
+    return Response(generate(), mimetype='application/zip', headers={
+        'Content-Disposition': attachment_header(f"batch_{batch_id[:8]}.zip"),
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    try:
+        params, error = validate_download_request(request.get_json())
+        if error:
+            return jsonify({'success': False, 'message': error})
+        
+        try:
+            job = subtitle_jobs.submit(process_download, **params)
+        except queue.Full:
+            return jsonify({'success': False, 'message': 'Máy chủ đang bận, vui lòng thử lại sau'}), 503
+        
+        return jsonify({'success': True, 'job_id': job['id'], 'status': job['status']}), 202
+        
+    except Exception as e:
+        logger.error(f"Create job error: {e}")
         return jsonify({'success': False, 'message': f'Lỗi server: {str(e)}'})
 
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    job = subtitle_jobs.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'message': 'Job not found (expired or created by another server process)'}), 404
+    
+    return jsonify({'success': True, 'job': job})
+
 @app.route('/download_file/<filename>')
 def download_file(filename):
     try:
@@ -721,35 +2930,37 @@ def download_file(filename):
         if not os.path.exists(file_path):
             return "File not found", 404
         
-        if filename.endswith('.srt'):
-            download_name = filename.replace(filename.split('_')[-1], '').rstrip('_') + '.srt'
-        elif filename.endswith('.txt'):
-            download_name = filename.replace(filename.split('_')[-1], '').rstrip('_') + '.txt'
+        # Drop the .gz and the kind (or legacy timestamp) suffix from the download name
+        name, ext = os.path.splitext(filename[:-len('.gz')] if filename.endswith('.gz') else filename)
+        format = ext.lstrip('.')
+        if format in SUBTITLE_RENDERERS:
+            download_name = name.rsplit('_', 1)[0] + ext
         else:
-            download_name = filename
+            download_name = name + ext
         
-        return send_file(file_path, as_attachment=True, download_name=download_name)
+        return send_cached_file(file_path, download_name, format)
         
     except Exception as e:
         logger.error(f"File download error: {e}")
         return f"Error: {e}", 500
 
+@app.route('/metrics')
+def metrics_endpoint():
+    if METRICS_TOKEN and request.headers.get('Authorization') != f"Bearer {METRICS_TOKEN}":
+        return "Unauthorized", 401
+    
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 # ===== BANNER ROUTES =====
 @app.route('/banner/click/<int:banner_id>')
 def banner_click(banner_id):
     try:
-        conn = sqlite3.connect('subtitle_app.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('UPDATE banners SET clicks = clicks + 1 WHERE id = ?', (banner_id,))
-        cursor.execute('SELECT link_url FROM banners WHERE id = ?', (banner_id,))
-        result = cursor.fetchone()
-        
-        conn.commit()
-        conn.close()
+        known, link_url = banner_cache.get_link(banner_id)
+        if known:
+            banner_clicks.increment(banner_id)
         
-        if result and result[0]:
-            return redirect(result[0])
+        if link_url:
+            return redirect(link_url)
         else:
             return redirect(url_for('index'))
             
@@ -764,7 +2975,7 @@ def admin_login():
         username = request.form.get('username')
         password = request.form.get('password')
         
-        conn = sqlite3.connect('subtitle_app.db')
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute('SELECT value FROM settings WHERE key = ?', ('admin_username',))
         db_username = cursor.fetchone()[0]
@@ -797,13 +3008,11 @@ def admin_dashboard():
 @admin_required
 def admin_stats():
     try:
-        conn = sqlite3.connect('subtitle_app.db')
+        conn = get_db()
         cursor = conn.cursor()
         
         # Active visitors
-        cutoff_time = datetime.now() - timedelta(minutes=5)
-        cursor.execute('SELECT COUNT(*) FROM visitors WHERE is_active = 1 AND last_activity > ?', (cutoff_time,))
-        active_visitors = cursor.fetchone()[0]
+        active_visitors = visitor_tracker.get_active_count()
         
         # Total downloads
         cursor.execute('SELECT SUM(download_count) FROM subtitle_downloads')
@@ -836,7 +3045,7 @@ def admin_stats():
 @admin_required
 def admin_visitors():
     try:
-        conn = sqlite3.connect('subtitle_app.db')
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -875,7 +3084,7 @@ def admin_visitors():
 @admin_required
 def admin_downloads():
     try:
-        conn = sqlite3.connect('subtitle_app.db')
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -913,7 +3122,7 @@ def admin_downloads():
 @admin_required
 def admin_banners():
     try:
-        conn = sqlite3.connect('subtitle_app.db')
+        conn = get_db()
         cursor = conn.cursor()
         
         if request.method == 'GET':
@@ -928,7 +3137,7 @@ def admin_banners():
                     'image_path': row[3],
                     'link_url': row[4],
                     'position': row[5],
-                    'clicks': row[6],
+                    'clicks': row[6] + banner_clicks.get_pending(row[0]),
                     'status': bool(row[7]),
                     'created_at': row[8]
                 })
@@ -939,6 +3148,7 @@ def admin_banners():
         elif request.method == 'POST':
             data = request.get_json()
             if not data:
+                conn.close()
                 return jsonify({'success': False, 'error': 'No data received'})
             
             cursor.execute('''
@@ -954,8 +3164,10 @@ def admin_banners():
             ))
             
             banner_id = cursor.lastrowid
+            bump_cache_version(cursor, 'banners')
             conn.commit()
             conn.close()
+            banner_cache.invalidate()
             
             return jsonify({
                 'success': True, 
@@ -966,6 +3178,7 @@ def admin_banners():
         elif request.method == 'PUT':
             data = request.get_json()
             if not data or not data.get('id'):
+                conn.close()
                 return jsonify({'success': False, 'error': 'Missing banner ID'})
             
             banner_id = data.get('id')
@@ -985,8 +3198,10 @@ def admin_banners():
                 banner_id
             ))
             
+            bump_cache_version(cursor, 'banners')
             conn.commit()
             conn.close()
+            banner_cache.invalidate()
             
             return jsonify({
                 'success': True, 
@@ -996,6 +3211,7 @@ def admin_banners():
         elif request.method == 'DELETE':
             data = request.get_json()
             if not data or not data.get('id'):
+                conn.close()
                 return jsonify({'success': False, 'error': 'Missing banner ID'})
             
             banner_id = data.get('id')
@@ -1014,8 +3230,10 @@ def admin_banners():
                         pass
             
             cursor.execute('DELETE FROM banners WHERE id = ?', (banner_id,))
+            bump_cache_version(cursor, 'banners')
             conn.commit()
             conn.close()
+            banner_cache.invalidate()
             
             return jsonify({
                 'success': True, 
@@ -1071,6 +3289,9 @@ def admin_cache():
     try:
         if request.method == 'GET':
             cache_info = get_cache_info()
+            cache_info['video_info_cache'] = video_info_cache.get_stats()
+            cache_info['extractions'] = extraction_flight.get_stats()
+            cache_info['jobs'] = subtitle_jobs.get_stats()
             return jsonify({'success': True, 'cache_info': cache_info})
             
         elif request.method == 'POST':
@@ -1099,11 +3320,21 @@ def admin_cache():
         logger.error(f"Cache API error: {e}")
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/admin/api/metrics')
+@admin_required
+def admin_metrics():
+    try:
+        return jsonify({'success': True, 'metrics': metrics.summary()})
+        
+    except Exception as e:
+        logger.error(f"Metrics API error: {e}")
+        return jsonify({'success': False, 'error': str(e)})
+
 @app.route('/admin/api/settings', methods=['GET', 'POST'])
 @admin_required
 def admin_settings():
     try:
-        conn = sqlite3.connect('subtitle_app.db')
+        conn = get_db()
         cursor = conn.cursor()
         
         if request.method == 'GET':
@@ -1147,7 +3378,52 @@ def admin_settings():
         logger.error(f"Settings API error: {e}")
         return jsonify({'success': False, 'error': str(e)})
 
+# ===== APP FACTORY =====
+# Everything with side effects lives here: log files, directories, the schema,
+# background threads and the extractor warm-up. Runs once per process, after
+# any fork, so each worker gets its own threads.
+app_started = False
+app_start_lock = threading.Lock()
+
+def create_app():
+    global app_started
+    if app_started:
+        return app
+    
+    with app_start_lock:
+        if app_started:
+            return app
+        
+        configure_logging()
+        
+        with boot_timer.phase('database'):
+            if init_db():
+                logger.info("Database schema initialized")
+        
+        with boot_timer.phase('services'):
+            for service in (visitor_tracker, subtitle_cache, subtitle_jobs, batch_jobs, banner_clicks):
+                service.start()
+        
+        if EXTRACTOR_WARMUP:
+            threading.Thread(target=subtitle_extractor.warm_up, name='extractor-warmup', daemon=True).start()
+        
+        logger.info(f"Boot: {boot_timer.report()}")
+        app_started = True
+        return app
+
+# Run migrations once at deploy time instead of in the first worker to boot
+@app.cli.command('init-db')
+def init_db_command():
+    configure_logging()
+    if init_db():
+        print(f"Database migrated to schema version {len(MIGRATIONS)}")
+    else:
+        print(f"Database already at schema version {len(MIGRATIONS)}")
+
+boot_timer.mark('module')
+
 if __name__ == '__main__':
+    create_app()
     print("🎬 YouTube Subtitle Downloader - Simplified Admin Panel")
     print("📍 Server: http://localhost:5008")
     print("🎯 Admin Panel: http://localhost:5008/admin")
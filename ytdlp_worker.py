@@ -0,0 +1,72 @@
+# Child side of the warm yt-dlp process pool (ProcessPoolYtDlpBackend in
+# server.py). Lives in its own module so workers import yt-dlp and requests
+# only, never the Flask app, its database or its background threads.
+#
+#   python ytdlp_worker.py <socket fd> <http timeout>
+import os
+import sys
+from multiprocessing.connection import Connection
+
+def worker_main(conn, http_timeout):
+    try:
+        import requests
+        import yt_dlp
+    except ImportError as e:
+        conn.send(('failed', str(e)))
+        return
+
+    base_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'skip_download': True,
+    }
+    # One YoutubeDL per option set, built once and reused for every task
+    video_ydl = yt_dlp.YoutubeDL({**base_opts, 'writesubtitles': True, 'writeautomaticsub': True})
+    playlist_ydls = {}
+    session = requests.Session()
+
+    conn.send(('ready', os.getpid()))
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+
+        method, args = message
+        try:
+            if method == 'extract_info':
+                url, = args
+                result = video_ydl.sanitize_info(video_ydl.extract_info(url, download=False))
+
+            elif method == 'extract_playlist':
+                url, limit = args
+                if limit not in playlist_ydls:
+                    playlist_ydls[limit] = yt_dlp.YoutubeDL({
+                        **base_opts,
+                        'extract_flat': 'in_playlist',
+                        'playlistend': limit,
+                    })
+                ydl = playlist_ydls[limit]
+                result = ydl.sanitize_info(ydl.extract_info(url, download=False))
+
+            elif method == 'fetch_track':
+                track, = args
+                response = session.get(track['url'], headers=track.get('http_headers'), timeout=http_timeout)
+                response.raise_for_status()
+                response.encoding = 'utf-8'
+                result = response.text
+
+            else:
+                raise ValueError(f"Unknown worker method: {method}")
+
+            conn.send(('ok', result))
+
+        except Exception as e:
+            # Only the type name and message cross the pipe; the parent re-raises
+            conn.send(('error', (type(e).__name__, str(e))))
+
+if __name__ == '__main__':
+    worker_main(Connection(int(sys.argv[1])), float(sys.argv[2]))